@@ -0,0 +1,53 @@
+""" Compare wall-clock time of the sync and async research graphs on N stubbed analysts
+
+Usage:
+    python bench_async_interviews.py --analysts 1 10 20 --latency 0.2
+
+The LLM and both retrievers are replaced with stubs that sleep for `--latency`
+seconds, so the numbers only reflect how the graph schedules I/O-bound work.
+The search query cache is cleared before each run, so neither graph reuses
+the queries generated by the other.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import research_assistant
+from bench_research_assistant import install_stubs
+
+def run_sync(num_analysts: int) -> float:
+    graph = research_assistant.builder.compile(checkpointer=MemorySaver())
+    thread = {"configurable": {"thread_id": "sync"}}
+    start = time.perf_counter()
+    graph.invoke({"topic": "benchmarking", "max_analysts": num_analysts}, thread)
+    return time.perf_counter() - start
+
+async def run_async(num_analysts: int) -> float:
+    graph = research_assistant.async_builder.compile(checkpointer=MemorySaver())
+    thread = {"configurable": {"thread_id": "async"}}
+    start = time.perf_counter()
+    await graph.ainvoke({"topic": "benchmarking", "max_analysts": num_analysts}, thread)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analysts", type=int, nargs="+", default=[1, 10, 20])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds slept by every stubbed LLM or retrieval call")
+    args = parser.parse_args()
+
+    print(f"{'analysts':>8} {'sync (s)':>10} {'async (s)':>10} {'speedup':>8} {'query cache (sync / async)':>30}")
+    for n in args.analysts:
+        install_stubs(n, args.latency)
+        research_assistant.search_query_cache.clear()
+        sync_time = run_sync(n)
+        sync_cache = research_assistant.search_query_cache.stats()
+        research_assistant.search_query_cache.clear()
+        async_time = asyncio.run(run_async(n))
+        async_cache = research_assistant.search_query_cache.stats()
+        cache = f"{sync_cache['hits']}/{sync_cache['misses']} / {async_cache['hits']}/{async_cache['misses']} hits/misses"
+        print(f"{n:>8} {sync_time:>10.2f} {async_time:>10.2f} {sync_time / async_time:>7.1f}x {cache:>30}")
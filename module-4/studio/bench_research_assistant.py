@@ -0,0 +1,177 @@
+""" Offline benchmark of the research graph with a deterministic fake LLM and stub retrievers
+
+Usage:
+    python bench_research_assistant.py --analysts 1 5 20 50 --latency 0.05
+    python bench_research_assistant.py --json results.json
+    python bench_research_assistant.py --baseline results.json --tolerance 0.2
+
+For every analyst count, reports end-to-end wall time, LLM calls, prompt tokens
+and per-node latency (count / mean / p95, interview nodes included). With
+`--baseline`, exits non-zero if wall time, LLM calls or prompt tokens grew by
+more than `--tolerance` (a fraction) against a previous `--json` run, so it can
+be used to catch regressions before merging.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.checkpoint.memory import MemorySaver
+
+import context_window
+import fakes
+import rate_limit
+import research_assistant
+import retrievers
+from research_assistant import Analyst, Perspectives, SearchQuery
+
+# Metrics compared against the baseline; all of them are "lower is better"
+REGRESSION_METRICS = ["wall_time", "llm_calls", "prompt_tokens"]
+
+def install_stubs(num_analysts: int, latency: float, output_tokens: int = 0) -> fakes.FakeChatModel:
+
+    """ Swap the LLM and retrievers used by research_assistant for stubs, and reset the process-wide caches """
+
+    analysts = [Analyst(affiliation="Benchmark", name=f"Analyst {i}", role="Tester", description=f"Focus area {i}")
+                for i in range(num_analysts)]
+    research_assistant.llm = fakes.FakeChatModel(
+        latency=latency,
+        output_tokens=output_tokens,
+        structured_responses={
+            Perspectives: lambda messages: Perspectives(analysts=analysts),
+            SearchQuery: lambda messages: SearchQuery(search_query=messages[-1].content[:50]),
+        },
+    )
+    # Uncached, so that every search pays the stub latency
+    research_assistant.web_retriever = retrievers.StubRetriever("web", num_docs=3, latency=latency, metadata_key="url")
+    research_assistant.wikipedia_retriever = retrievers.StubRetriever("wikipedia", num_docs=2, latency=latency)
+    # Nothing generated, analyzed or rate-limited by an earlier run carries over, so results do not depend on run order
+    research_assistant.search_query_cache.clear()
+    context_window.analyze.cache_clear()
+    rate_limit.get_rate_limiter.cache_clear()
+    return research_assistant.llm
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects the duration of every graph node run, keyed by node name."""
+
+    # Called inline, so the timings are not skewed by callback scheduling
+    run_inline = True
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+        # A node's own run is the chain named after it; skip runnables nested inside nodes
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and name == node:
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, start = started
+                self.durations[node].append(time.perf_counter() - start)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def summary(self) -> dict:
+        return {node: {
+                    "count": len(durations),
+                    "mean": statistics.fmean(durations),
+                    "p95": statistics.quantiles(durations, n=20, method="inclusive")[-1] if len(durations) > 1 else durations[0],
+                } for node, durations in sorted(self.durations.items())}
+
+def run(num_analysts: int, latency: float, output_tokens: int, mode: str) -> dict:
+
+    """ Run the graph once on stubs and collect its metrics """
+
+    llm = install_stubs(num_analysts, latency, output_tokens)
+    timer = NodeTimer()
+    config = {"configurable": {"thread_id": f"{mode}-{num_analysts}"}, "callbacks": [timer]}
+    input = {"topic": "benchmarking", "max_analysts": num_analysts}
+
+    start = time.perf_counter()
+    if mode == "async":
+        graph = research_assistant.async_builder.compile(checkpointer=MemorySaver())
+        asyncio.run(graph.ainvoke(input, config))
+    else:
+        graph = research_assistant.builder.compile(checkpointer=MemorySaver())
+        graph.invoke(input, config)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "analysts": num_analysts,
+        "mode": mode,
+        "wall_time": wall_time,
+        "llm_calls": llm.calls,
+        "prompt_tokens": llm.prompt_tokens,
+        "nodes": timer.summary(),
+    }
+
+def print_result(result: dict):
+    print(f"\n{result['analysts']} analysts ({result['mode']}): {result['wall_time']:.2f}s wall, "
+          f"{result['llm_calls']} LLM calls, {result['prompt_tokens']} prompt tokens")
+    print(f"  {'node':<20} {'count':>6} {'mean (ms)':>10} {'p95 (ms)':>10}")
+    for node, stats in result["nodes"].items():
+        print(f"  {node:<20} {stats['count']:>6} {stats['mean'] * 1000:>10.1f} {stats['p95'] * 1000:>10.1f}")
+
+def find_regressions(results: list, baseline: list, tolerance: float) -> list:
+
+    """ Metrics that grew by more than `tolerance` against the baseline run with the same analysts and mode """
+
+    previous = {(r["analysts"], r["mode"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result["analysts"], result["mode"]))
+        if base is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{result['analysts']} analysts ({result['mode']}) {metric}: "
+                                   f"{base[metric]:.2f} -> {result[metric]:.2f}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analysts", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds slept by every stubbed LLM or retrieval call")
+    parser.add_argument("--output-tokens", type=int, default=200, help="Tokens in every fake LLM response")
+    parser.add_argument("--mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results of a previous --json run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative growth of each metric")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.analysts:
+        result = run(n, args.latency, args.output_tokens, args.mode)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
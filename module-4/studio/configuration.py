@@ -0,0 +1,45 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+@dataclass(kw_only=True)
+class Configuration:
+    """The configurable fields for the research graphs."""
+    # Provider limits shared by every branch in the process (0 means no limit)
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    max_concurrency: int = 0
+    # Tokens reserved for the completion of each call, settled against usage afterwards
+    expected_output_tokens: int = 500
+    # Tokens of source documents an interview keeps in its `context` state.
+    # State reducers are fixed when the graph is compiled, so only the default
+    # or the MAX_CONTEXT_TOKENS environment variable applies, not a run's config
+    max_context_tokens: int = 6000
+    # Tokens of those documents packed into each answer / section prompt
+    context_token_budget: int = 4000
+    # Interview stopping policy, see interview_policy.InterviewPolicy (0 turns the novelty rule off)
+    min_interview_turns: int = 1
+    min_new_sources: int = 0
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None
+    ) -> "Configuration":
+        """Create a Configuration instance from a RunnableConfig."""
+        configurable = (
+            config["configurable"] if config and "configurable" in config else {}
+        )
+        values: dict[str, Any] = {
+            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
+            for f in fields(cls)
+            if f.init
+        }
+        # Limits set through the environment come in as strings
+        numeric = {f.name: f.type for f in fields(cls) if f.type in (int, float)}
+        return cls(**{
+            k: numeric[k](v) if k in numeric and isinstance(v, str) else v
+            for k, v in values.items()
+            if v is not None
+        })
@@ -0,0 +1,127 @@
+""" Bounded accumulation and packing of retrieved documents
+
+Retrieval nodes write lists of Documents to a `context` key. Instead of
+appending with operator.add, the key uses a reducer from `context_reducer` that
+keeps one copy per source url and, once the documents exceed a token budget,
+evicts the least relevant ones, so the prompt stays the same size however many
+turns an interview runs.
+
+Before prompting, `pack_context` ranks the documents against the question with
+BM25 and keeps the best ones that fit a token budget. Token counts and term
+frequencies are computed once per distinct text and cached.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words and punctuation, a cheap local stand-in for the model tokenizer"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+@lru_cache(maxsize=4096)
+def analyze(text: str) -> tuple[int, Counter]:
+    """Token count and term frequencies of a text, computed once per distinct text"""
+    tokens = tokenize(text)
+    return len(tokens), Counter(t for t in tokens if t.isalnum())
+
+def count_tokens(text: str) -> int:
+    return analyze(text)[0]
+
+def source_key(doc: Document) -> str:
+    """Web results are identified by url, Wikipedia pages by source"""
+    return doc.metadata.get("url") or doc.metadata.get("source") or doc.page_content
+
+def score_documents(query: str, docs: List[Document]) -> List[Document]:
+    """Annotate retrieved documents with their token count and relevance to the search query.
+
+    Relevance is the fraction of query terms that appear in the document.
+    """
+    query_terms = analyze(query)[1].keys()
+    scored = []
+    for doc in docs:
+        tokens, terms = analyze(doc.page_content)
+        relevance = sum(1 for t in query_terms if t in terms) / len(query_terms) if query_terms else 0.0
+        scored.append(Document(
+            page_content=doc.page_content,
+            metadata={**doc.metadata, "tokens": tokens, "relevance": relevance},
+        ))
+    return scored
+
+def _tokens(doc: Document) -> int:
+    tokens = doc.metadata.get("tokens")
+    return tokens if tokens is not None else count_tokens(doc.page_content)
+
+def merge_context(left: Optional[List[Document]], right: Optional[List[Document]], max_tokens: int) -> List[Document]:
+    """Merge new documents into the context, deduplicated by source and within `max_tokens`."""
+    merged: dict[str, Document] = {}
+    for doc in (left or []) + (right or []):
+        key = source_key(doc)
+        # Keep the first position of a source, but the most relevant copy of it
+        if key not in merged or doc.metadata.get("relevance", 0) >= merged[key].metadata.get("relevance", 0):
+            merged[key] = doc
+    docs = list(merged.values())
+
+    # Evict the least relevant documents (oldest first on ties) until within budget
+    total = sum(_tokens(doc) for doc in docs)
+    if total > max_tokens:
+        evict = set()
+        for i in sorted(range(len(docs)), key=lambda i: (docs[i].metadata.get("relevance", 0), i)):
+            if total <= max_tokens:
+                break
+            evict.add(i)
+            total -= _tokens(docs[i])
+        docs = [doc for i, doc in enumerate(docs) if i not in evict]
+    return docs
+
+def context_reducer(max_tokens: int) -> Callable[[Optional[List[Document]], Optional[List[Document]]], List[Document]]:
+    """Reducer for a `context` state key holding at most `max_tokens` of documents"""
+    def reducer(left, right):
+        return merge_context(left, right, max_tokens)
+    return reducer
+
+def format_document(doc: Document) -> str:
+    if "url" in doc.metadata:
+        return f'<Document href="{doc.metadata["url"]}"/>\n{doc.page_content}\n</Document>'
+    return f'<Document source="{doc.metadata.get("source", "")}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
+
+def format_documents(docs: List[Document]) -> str:
+    """Format documents as the source blocks the prompts expect"""
+    return "\n\n---\n\n".join(format_document(doc) for doc in docs)
+
+def bm25_scores(query: str, docs: List[Document], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each document for the query, with the documents as the corpus"""
+    if not docs:
+        return []
+    analyzed = [analyze(doc.page_content) for doc in docs]
+    avg_length = sum(length for length, _ in analyzed) / len(docs) or 1.0
+    scores = [0.0] * len(docs)
+    for term in analyze(query)[1]:
+        containing = sum(1 for _, terms in analyzed if term in terms)
+        if not containing:
+            continue
+        idf = math.log(1 + (len(docs) - containing + 0.5) / (containing + 0.5))
+        for i, (length, terms) in enumerate(analyzed):
+            tf = terms.get(term, 0)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+    return scores
+
+def pack_context(query: str, docs: List[Document], max_tokens: int) -> List[Document]:
+    """The documents most relevant to `query` (by BM25) that fit in `max_tokens`, best first.
+
+    Documents that alone exceed the remaining budget are skipped in favour of smaller ones.
+    """
+    scores = bm25_scores(query, docs)
+    packed, used = [], 0
+    for i in sorted(range(len(docs)), key=lambda i: -scores[i]):
+        tokens = _tokens(docs[i])
+        if used + tokens <= max_tokens:
+            packed.append(docs[i])
+            used += tokens
+    return packed
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from pydantic import PrivateAttr
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+import context_window
+
+### Fake chat model
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that sleeps for `latency` seconds and returns canned text.
+
+    The text is suffixed with a digest of the input messages, so different
+    prompts (e.g. different analyst personas) produce different conversations,
+    and padded with filler words up to `output_tokens` tokens.
+
+    Structured output is supported by registering a factory per schema in
+    `structured_responses`, which is called with the input messages and must
+    return an instance of the schema.
+
+    `calls` and `prompt_tokens` count every call, structured or not, across threads.
+    """
+
+    latency: float = 0.0
+    response: str = "This is a fake response."
+    output_tokens: int = 0
+    structured_responses: Dict[type, Callable[[List[BaseMessage]], Any]] = {}
+    calls: int = 0
+    prompt_tokens: int = 0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _record(self, messages: List[Any]) -> int:
+        """Count the call and return its prompt tokens"""
+        tokens = sum(context_window.count_tokens(str(m.content) if isinstance(m, BaseMessage) else str(m))
+                     for m in messages)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += tokens
+        return tokens
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        input_tokens = self._record(messages)
+        digest = hashlib.sha1("".join(str(m.content) for m in messages).encode()).hexdigest()[:8]
+        content = f"{self.response} [{digest}]"
+        padding = self.output_tokens - context_window.count_tokens(content)
+        if padding > 0:
+            content += " lorem" * padding
+        output_tokens = context_window.count_tokens(content)
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _chunks(self, messages: List[BaseMessage]):
+        # Stream the response word by word, with the usage on the last chunk
+        message = self._message(messages)
+        words = re.findall(r"\S+\s*", message.content)
+        for i, word in enumerate(words):
+            usage = message.usage_metadata if i == len(words) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word, usage_metadata=usage))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        yield from self._chunks(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        factory = self.structured_responses[schema]
+
+        def invoke(messages):
+            time.sleep(self.latency)
+            self._record(messages)
+            return factory(messages)
+
+        async def ainvoke(messages):
+            await asyncio.sleep(self.latency)
+            self._record(messages)
+            return factory(messages)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
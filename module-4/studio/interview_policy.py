@@ -0,0 +1,48 @@
+""" When to end an interview
+
+route_messages runs after every expert answer and asks an InterviewPolicy
+whether to ask another question or save the interview. Besides the turn cap
+and the analyst's closing phrase, the policy can end an interview early once a
+turn's retrieval stops bringing in new sources, since further turns would
+mostly re-answer from the same documents. The novelty rule is off unless
+`min_new_sources` is set; set it, or lower `max_num_turns`, for faster,
+shallower reports.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+
+import configuration
+
+@dataclass(kw_only=True)
+class InterviewPolicy:
+    """Stopping rule for the interview loop."""
+    # Hard cap on expert answers
+    max_num_turns: int = 2
+    # Answers before the novelty rule may end the interview
+    min_turns: int = 1
+    # End once a turn adds fewer new sources than this (0, the default, disables the novelty rule)
+    min_new_sources: int = 0
+    # Phrase the analyst uses to close the interview
+    stop_phrase: str = "Thank you so much for your help"
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None, max_num_turns: int = 2
+    ) -> "InterviewPolicy":
+        """Create a policy from the graph configuration and the interview's turn cap."""
+        configurable = configuration.Configuration.from_runnable_config(config)
+        return cls(
+            max_num_turns=max_num_turns,
+            min_turns=configurable.min_interview_turns,
+            min_new_sources=configurable.min_new_sources,
+        )
+
+    def should_stop(self, num_responses: int, new_sources: int, last_question: str) -> bool:
+        """Whether the interview is over after `num_responses` answers."""
+        if num_responses >= self.max_num_turns:
+            return True
+        if self.stop_phrase in last_question:
+            return True
+        return num_responses >= self.min_turns and new_sources < self.min_new_sources
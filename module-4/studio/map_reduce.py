@@ -4,11 +4,15 @@ from typing_extensions import TypedDict
 
 from pydantic import BaseModel
 
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI 
 
 from langgraph.constants import Send
 from langgraph.graph import END, StateGraph, START
 
+import configuration
+import rate_limit
+
 # Prompts we will use
 subjects_prompt = """Generate a list of 3 sub-topics that are all related to this overall topic: {topic}."""
 joke_prompt = """Generate a joke about {subject}"""
@@ -30,33 +34,34 @@ class OverallState(TypedDict):
     jokes: Annotated[list, operator.add]
     best_selected_joke: str
 
-def generate_topics(state: OverallState):
+def generate_topics(state: OverallState, config: RunnableConfig):
     prompt = subjects_prompt.format(topic=state["topic"])
-    response = model.with_structured_output(Subjects).invoke(prompt)
+    response = rate_limit.invoke(model.with_structured_output(Subjects), prompt, config)
     return {"subjects": response.subjects}
 
 class JokeState(TypedDict):
     subject: str
+    priority: int
 
 class Joke(BaseModel):
     joke: str
 
-def generate_joke(state: JokeState):
+def generate_joke(state: JokeState, config: RunnableConfig):
     prompt = joke_prompt.format(subject=state["subject"])
-    response = model.with_structured_output(Joke).invoke(prompt)
+    response = rate_limit.invoke(model.with_structured_output(Joke), prompt, config, priority=state.get("priority", 0))
     return {"jokes": [response.joke]}
 
-def best_joke(state: OverallState):
+def best_joke(state: OverallState, config: RunnableConfig):
     jokes = "\n\n".join(state["jokes"])
     prompt = best_joke_prompt.format(topic=state["topic"], jokes=jokes)
-    response = model.with_structured_output(BestJoke).invoke(prompt)
+    response = rate_limit.invoke(model.with_structured_output(BestJoke), prompt, config)
     return {"best_selected_joke": state["jokes"][response.id]}
 
 def continue_to_jokes(state: OverallState):
-    return [Send("generate_joke", {"subject": s}) for s in state["subjects"]]
+    return [Send("generate_joke", {"subject": s, "priority": i}) for i, s in enumerate(state["subjects"])]
 
 # Construct the graph: here we put everything together to construct our graph
-graph_builder = StateGraph(OverallState)
+graph_builder = StateGraph(OverallState, config_schema=configuration.Configuration)
 graph_builder.add_node("generate_topics", generate_topics)
 graph_builder.add_node("generate_joke", generate_joke)
 graph_builder.add_node("best_joke", best_joke)
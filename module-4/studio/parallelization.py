@@ -2,71 +2,61 @@ import operator
 from typing import Annotated
 from typing_extensions import TypedDict
 
-from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, SystemMessage
-
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools import TavilySearchResults
+from langchain_core.runnables import RunnableConfig
 
 from langchain_openai import ChatOpenAI
 
 from langgraph.graph import StateGraph, START, END
 
+import configuration
+import context_window
+import retrievers
+
 llm = ChatOpenAI(model="gpt-4o", temperature=0) 
 
 class State(TypedDict):
     question: str
     answer: str
-    context: Annotated[list, operator.add]
+    context: Annotated[list, operator.add] # Source documents
+
+# Retrievers, backed by the on-disk retrieval cache
+web_retriever = retrievers.CachedRetriever(retrievers.TavilyRetriever(max_results=3))
+wikipedia_retriever = retrievers.CachedRetriever(retrievers.WikipediaRetriever(load_max_docs=2))
 
 def search_web(state):
     
     """ Retrieve docs from web search """
 
     # Search
-    tavily_search = TavilySearchResults(max_results=3)
-    search_docs = tavily_search.invoke(state['question'])
+    search_docs = web_retriever.search(state['question'])
 
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
-        ]
-    )
-
-    return {"context": [formatted_search_docs]} 
+    return {"context": search_docs} 
 
 def search_wikipedia(state):
     
     """ Retrieve docs from wikipedia """
 
     # Search
-    search_docs = WikipediaLoader(query=state['question'], 
-                                  load_max_docs=2).load()
-
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    search_docs = wikipedia_retriever.search(state['question'])
 
-    return {"context": [formatted_search_docs]} 
+    return {"context": search_docs} 
 
-def generate_answer(state):
+def generate_answer(state, config: RunnableConfig):
     
     """ Node to answer a question """
 
     # Get state
-    context = state["context"]
     question = state["question"]
 
+    # Pack the sources most relevant to the question into the token budget
+    budget = configuration.Configuration.from_runnable_config(config).context_token_budget
+    context = context_window.pack_context(question, state["context"], budget)
+
     # Template
     answer_template = """Answer the question {question} using this context: {context}"""
     answer_instructions = answer_template.format(question=question, 
-                                                       context=context)    
+                                                       context=context_window.format_documents(context))    
     
     # Answer
     answer = llm.invoke([SystemMessage(content=answer_instructions)]+[HumanMessage(content=f"Answer the question.")])
@@ -75,7 +65,7 @@ def generate_answer(state):
     return {"answer": answer}
 
 # Add nodes
-builder = StateGraph(State)
+builder = StateGraph(State, config_schema=configuration.Configuration)
 
 # Initialize each node with node_secret 
 builder.add_node("search_web",search_web)
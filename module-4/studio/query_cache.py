@@ -0,0 +1,81 @@
+""" Memoized search-query generation shared by the parallel retrieval nodes
+
+search_web and search_wikipedia run in parallel on the same message history and
+would each ask the LLM for the same SearchQuery. The cache is keyed on the
+messages; the first caller generates the query and any concurrent caller with
+the same key waits for that result instead of making its own call.
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, List, TypeVar
+
+from langchain_core.messages import BaseMessage, get_buffer_string
+
+T = TypeVar("T")
+
+def messages_key(messages: List[BaseMessage]) -> str:
+    """Stable key for a message history"""
+    return hashlib.sha256(get_buffer_string(messages).encode()).hexdigest()
+
+class QueryCache:
+    """LRU of generated values keyed on message history, with hit / miss counters."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._futures: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str) -> tuple[Future, bool]:
+        """Return the future for `key` and whether the caller has to compute it."""
+        with self._lock:
+            if key in self._futures:
+                self.hits += 1
+                self._futures.move_to_end(key)
+                return self._futures[key], False
+            self.misses += 1
+            future = Future()
+            self._futures[key] = future
+            if len(self._futures) > self.maxsize:
+                self._futures.popitem(last=False)
+            return future, True
+
+    def _fail(self, key: str, future: Future, error: BaseException):
+        # Drop failed entries so the next caller retries
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        future.set_exception(error)
+
+    def get_or_create(self, messages: List[BaseMessage], create: Callable[[], T]) -> T:
+        key = messages_key(messages)
+        future, owner = self._claim(key)
+        if owner:
+            try:
+                future.set_result(create())
+            except BaseException as error:
+                self._fail(key, future, error)
+        return future.result()
+
+    async def aget_or_create(self, messages: List[BaseMessage], create: Callable[[], Awaitable[T]]) -> T:
+        key = messages_key(messages)
+        future, owner = self._claim(key)
+        if owner:
+            try:
+                future.set_result(await create())
+            except BaseException as error:
+                self._fail(key, future, error)
+        return await asyncio.wrap_future(future)
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._futures)}
@@ -0,0 +1,239 @@
+""" Process-wide rate limiting for the LLM calls made by fanned-out Send() branches
+
+Every branch started by Send() calls the provider at once. Instead of letting
+them all fire and collapse into 429 backoff, each call first takes a ticket from
+a shared RateLimiter. Tickets are granted in priority order (lower first) while
+both the requests-per-minute and tokens-per-minute buckets have room and fewer
+than `max_concurrency` calls are in flight.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+
+import configuration
+
+class TokenBucket:
+    """Holds up to `per_minute` units and refills continuously at `per_minute / 60` units per second."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+@dataclass(order=True)
+class Ticket:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    wake: Callable[[], None] = field(compare=False, repr=False)
+    granted: bool = field(default=False, compare=False)
+
+class RateLimiter:
+    """Grants LLM calls in priority order within request, token and concurrency limits.
+
+    A limit of 0 disables it. Safe to share between threads (sync graphs) and
+    event loops (async graphs).
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrency: int = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._waiting: list[Ticket] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _wait_time(self, ticket: Ticket) -> Optional[float]:
+        """Seconds until the buckets can grant `ticket`, or None if blocked on concurrency."""
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(ticket.tokens))
+        return max(waits)
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant tickets from the head of the queue; return how long the head has to wait."""
+        with self._lock:
+            while self._waiting:
+                head = self._waiting[0]
+                wait = self._wait_time(head)
+                if wait is None or wait > 0:
+                    return wait
+                heapq.heappop(self._waiting)
+                if self.requests:
+                    self.requests.consume(1)
+                if self.tokens:
+                    self.tokens.consume(head.tokens)
+                self.in_flight += 1
+                head.granted = True
+                head.wake()
+            return None
+
+    def _enqueue(self, tokens: int, priority: int, wake: Callable[[], None]) -> Ticket:
+        ticket = Ticket(priority, next(self._seq), tokens, wake)
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _cancel(self, ticket: Ticket):
+        """Drop a ticket whose caller stopped waiting, releasing it if it was granted meanwhile."""
+        with self._lock:
+            if not ticket.granted:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                return
+        self.release(ticket)
+
+    def acquire(self, tokens: int, priority: int = 0) -> Ticket:
+        """Block the calling thread until the call may start."""
+        event = threading.Event()
+        ticket = self._enqueue(tokens, priority, event.set)
+        try:
+            while not ticket.granted:
+                # Whoever times out first re-runs dispatch once the buckets have refilled
+                event.wait(self._dispatch())
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        return ticket
+
+    async def aacquire(self, tokens: int, priority: int = 0) -> Ticket:
+        """Wait on the event loop until the call may start."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(tokens, priority, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while not ticket.granted:
+                try:
+                    await asyncio.wait_for(event.wait(), self._dispatch())
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None):
+        """Mark the call as finished and settle the token reservation against actual usage."""
+        with self._lock:
+            self.in_flight -= 1
+            if self.tokens and used_tokens is not None:
+                if used_tokens > ticket.tokens:
+                    self.tokens.consume(used_tokens - ticket.tokens)
+                else:
+                    self.tokens.refund(ticket.tokens - used_tokens)
+        self._dispatch()
+
+@lru_cache
+def get_rate_limiter(requests_per_minute: int, tokens_per_minute: int, max_concurrency: int) -> RateLimiter:
+    """One limiter per distinct set of limits, shared by every branch in the process"""
+    return RateLimiter(requests_per_minute, tokens_per_minute, max_concurrency)
+
+def estimate_tokens(input: Any, expected_output_tokens: int) -> int:
+    """Cheap estimate (~4 characters per token) of prompt plus completion tokens"""
+    if isinstance(input, str):
+        chars = len(input)
+    else:
+        chars = sum(len(m.content) if isinstance(m, BaseMessage) else len(str(m)) for m in input)
+    return chars // 4 + expected_output_tokens
+
+def used_tokens(output: Any) -> Optional[int]:
+    """Total tokens reported by the provider, if the output carries usage metadata"""
+    usage = getattr(output, "usage_metadata", None)
+    return usage["total_tokens"] if usage else None
+
+def _limiter_and_tokens(input: Any, config: Optional[RunnableConfig]):
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if not (configurable.requests_per_minute or configurable.tokens_per_minute or configurable.max_concurrency):
+        return None, 0
+    limiter = get_rate_limiter(configurable.requests_per_minute, configurable.tokens_per_minute, configurable.max_concurrency)
+    return limiter, estimate_tokens(input, configurable.expected_output_tokens)
+
+def invoke(runnable, input: Any, config: Optional[RunnableConfig] = None, priority: int = 0):
+    """Invoke `runnable` once the shared limiter configured in `config` grants a ticket"""
+    limiter, tokens = _limiter_and_tokens(input, config)
+    if limiter is None:
+        return runnable.invoke(input)
+    ticket = limiter.acquire(tokens, priority)
+    output = None
+    try:
+        output = runnable.invoke(input)
+        return output
+    finally:
+        limiter.release(ticket, used_tokens(output))
+
+async def ainvoke(runnable, input: Any, config: Optional[RunnableConfig] = None, priority: int = 0):
+    """Async version of `invoke`"""
+    limiter, tokens = _limiter_and_tokens(input, config)
+    if limiter is None:
+        return await runnable.ainvoke(input)
+    ticket = await limiter.aacquire(tokens, priority)
+    output = None
+    try:
+        output = await runnable.ainvoke(input)
+        return output
+    finally:
+        limiter.release(ticket, used_tokens(output))
+
+def stream(runnable, input: Any, config: Optional[RunnableConfig] = None, priority: int = 0):
+    """Stream `runnable` once granted a ticket, holding it until the stream ends"""
+    limiter, tokens = _limiter_and_tokens(input, config)
+    if limiter is None:
+        yield from runnable.stream(input)
+        return
+    ticket = limiter.acquire(tokens, priority)
+    output = None
+    try:
+        for chunk in runnable.stream(input):
+            output = chunk if output is None else output + chunk
+            yield chunk
+    finally:
+        limiter.release(ticket, used_tokens(output))
+
+async def astream(runnable, input: Any, config: Optional[RunnableConfig] = None, priority: int = 0):
+    """Async version of `stream`"""
+    limiter, tokens = _limiter_and_tokens(input, config)
+    if limiter is None:
+        async for chunk in runnable.astream(input):
+            yield chunk
+        return
+    ticket = await limiter.aacquire(tokens, priority)
+    output = None
+    try:
+        async for chunk in runnable.astream(input):
+            output = chunk if output is None else output + chunk
+            yield chunk
+    finally:
+        limiter.release(ticket, used_tokens(output))
@@ -0,0 +1,105 @@
+""" Assemble the research report from the section chunks streamed by the finalize nodes
+
+write_introduction, write_report and write_conclusion run in parallel and emit
+LangGraph custom stream events while their LLM calls stream:
+
+    {"section": "introduction" | "content" | "conclusion", "delta": "..."}
+    {"section": ..., "done": True}
+
+ReportAssembler turns those events back into the final markdown in report
+order, releasing text as soon as it is certain to be part of the final report,
+so a client can show the introduction while the body is still being written.
+"""
+from typing import Iterator, AsyncIterator, Optional
+
+SECTIONS = ("introduction", "content", "conclusion")
+SEPARATOR = "\n\n---\n\n"
+INSIGHTS_HEADER = "## Insights"
+SOURCES_HEADER = "\n## Sources\n"
+
+def split_sources(content: str) -> tuple[str, Optional[str]]:
+    """Drop the "## Insights" title from the report body and split off its sources"""
+    content = content.removeprefix(INSIGHTS_HEADER)
+    if SOURCES_HEADER in content:
+        body, sources = content.split(SOURCES_HEADER, 1)
+        return body, sources
+    return content, None
+
+def assemble_report(introduction: str, content: str, conclusion: str) -> str:
+    """Introduction, body and conclusion, with the body's sources moved to the end"""
+    body, sources = split_sources(content)
+    report = introduction + SEPARATOR + body + SEPARATOR + conclusion
+    if sources is not None:
+        report += "\n\n## Sources\n" + sources
+    return report
+
+class ReportAssembler:
+    """Collects streamed section events and releases the report text in order."""
+
+    def __init__(self):
+        self.buffers = {section: "" for section in SECTIONS}
+        self.done = set()
+        self.emitted = ""
+
+    def _stable_text(self) -> str:
+        """The longest prefix of the final report that can no longer change"""
+        text = self.buffers["introduction"]
+        if "introduction" not in self.done:
+            return text
+        text += SEPARATOR
+
+        content = self.buffers["content"]
+        if "content" not in self.done:
+            # Hold back text that may still turn out to be the title or the sources
+            if INSIGHTS_HEADER.startswith(content):
+                return text
+            body = content.removeprefix(INSIGHTS_HEADER)
+            if SOURCES_HEADER in body:
+                return text + body[:body.index(SOURCES_HEADER)]
+            return text + body[:max(0, len(body) - len(SOURCES_HEADER) + 1)]
+        body, sources = split_sources(content)
+        text += body + SEPARATOR
+
+        text += self.buffers["conclusion"]
+        if "conclusion" in self.done and sources is not None:
+            text += "\n\n## Sources\n" + sources
+        return text
+
+    def add(self, event: dict) -> str:
+        """Apply one stream event and return the newly released report text (possibly empty)."""
+        section = event["section"]
+        self.buffers[section] += event.get("delta", "")
+        if event.get("done"):
+            self.done.add(section)
+        text = self._stable_text()
+        new_text = text[len(self.emitted):]
+        self.emitted = text
+        return new_text
+
+    @property
+    def complete(self) -> bool:
+        return self.done.issuperset(SECTIONS)
+
+    @property
+    def markdown(self) -> str:
+        """The full report, once every section is done"""
+        return assemble_report(*(self.buffers[section] for section in SECTIONS))
+
+def _is_section_event(chunk) -> bool:
+    return isinstance(chunk, dict) and chunk.get("section") in SECTIONS
+
+def stream_report(graph, input, config=None) -> Iterator[str]:
+    """Run `graph` and yield the report markdown in order as the sections stream in"""
+    assembler = ReportAssembler()
+    for chunk in graph.stream(input, config, stream_mode="custom"):
+        if _is_section_event(chunk):
+            if text := assembler.add(chunk):
+                yield text
+
+async def astream_report(graph, input, config=None) -> AsyncIterator[str]:
+    """Async version of `stream_report`"""
+    assembler = ReportAssembler()
+    async for chunk in graph.astream(input, config, stream_mode="custom"):
+        if _is_section_event(chunk):
+            if text := assembler.add(chunk):
+                yield text
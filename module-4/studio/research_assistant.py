@@ -1,20 +1,32 @@
 import operator
+import re
 from pydantic import BaseModel, Field
 from typing import Annotated, List
 from typing_extensions import TypedDict
 
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 
+from langgraph.config import get_stream_writer
 from langgraph.constants import Send
 from langgraph.graph import END, MessagesState, START, StateGraph
 
+import configuration
+import context_window
+import interview_policy
+import query_cache
+import rate_limit
+import report_stream
+import retrievers
+
 ### LLM
 
 llm = ChatOpenAI(model="gpt-4o", temperature=0) 
 
+# Token budget for the source documents kept in an interview's context
+MAX_CONTEXT_TOKENS = configuration.Configuration.from_runnable_config().max_context_tokens
+
 ### Schema 
 
 class Analyst(BaseModel):
@@ -47,10 +59,15 @@ class GenerateAnalystsState(TypedDict):
 
 class InterviewState(MessagesState):
     max_num_turns: int # Number turns of conversation
-    context: Annotated[list, operator.add] # Source docs
+    context: Annotated[list, context_window.context_reducer(MAX_CONTEXT_TOKENS)] # Source docs, deduplicated by source and bounded in tokens
     analyst: Analyst # Analyst asking questions
     interview: str # Interview transcript
     sections: list # Final key we duplicate in outer state for Send() API
+    section_digests: list # Digest of the section, duplicated in outer state alongside sections
+    priority: int # Scheduling priority of this interview's LLM calls (lower goes first)
+    num_responses: int # Number of expert answers so far
+    seen_sources: list # Sources the expert has had in context so far
+    new_sources: int # Sources first seen in the latest turn
 
 class SearchQuery(BaseModel):
     search_query: str = Field(None, description="Search query for retrieval.")
@@ -61,6 +78,7 @@ class ResearchGraphState(TypedDict):
     human_analyst_feedback: str # Human feedback
     analysts: List[Analyst] # Analyst asking questions
     sections: Annotated[list, operator.add] # Send() API key
+    section_digests: Annotated[list, operator.add] # Title, opening summary and token counts of each section
     introduction: str # Introduction for the final report
     content: str # Content for the final report
     conclusion: str # Conclusion for the final report
@@ -83,28 +101,40 @@ analyst_instructions="""You are tasked with creating a set of AI analyst persona
 
 5. Assign one analyst to each theme."""
 
-def create_analysts(state: GenerateAnalystsState):
+def analyst_messages(state: GenerateAnalystsState):
     
-    """ Create analysts """
+    """ Prompt for creating the analysts """
     
     topic=state['topic']
     max_analysts=state['max_analysts']
     human_analyst_feedback=state.get('human_analyst_feedback', '')
-        
-    # Enforce structured output
-    structured_llm = llm.with_structured_output(Perspectives)
 
     # System message
     system_message = analyst_instructions.format(topic=topic,
                                                             human_analyst_feedback=human_analyst_feedback, 
                                                             max_analysts=max_analysts)
+    return [SystemMessage(content=system_message)]+[HumanMessage(content="Generate the set of analysts.")]
+
+def create_analysts(state: GenerateAnalystsState, config: RunnableConfig):
+    
+    """ Create analysts """
+        
+    # Enforce structured output
+    structured_llm = llm.with_structured_output(Perspectives)
 
     # Generate question 
-    analysts = structured_llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content="Generate the set of analysts.")])
+    analysts = rate_limit.invoke(structured_llm, analyst_messages(state), config)
     
     # Write the list of analysis to state
     return {"analysts": analysts.analysts}
 
+async def acreate_analysts(state: GenerateAnalystsState, config: RunnableConfig):
+    
+    """ Create analysts (async) """
+    
+    analysts = await rate_limit.ainvoke(llm.with_structured_output(Perspectives), analyst_messages(state), config)
+    return {"analysts": analysts.analysts}
+
 def human_feedback(state: GenerateAnalystsState):
     """ No-op node that should be interrupted on """
     pass
@@ -128,21 +158,30 @@ When you are satisfied with your understanding, complete the interview with: "Th
 
 Remember to stay in character throughout your response, reflecting the persona and goals provided to you."""
 
-def generate_question(state: InterviewState):
+def question_messages(state: InterviewState):
 
-    """ Node to generate a question """
+    """ Prompt for the analyst's next question """
 
-    # Get state
-    analyst = state["analyst"]
-    messages = state["messages"]
+    system_message = question_instructions.format(goals=state["analyst"].persona)
+    return [SystemMessage(content=system_message)]+state["messages"]
+
+def generate_question(state: InterviewState, config: RunnableConfig):
+
+    """ Node to generate a question """
 
     # Generate question 
-    system_message = question_instructions.format(goals=analyst.persona)
-    question = llm.invoke([SystemMessage(content=system_message)]+messages)
+    question = rate_limit.invoke(llm, question_messages(state), config, priority=state.get("priority", 0))
         
     # Write messages to state
     return {"messages": [question]}
 
+async def agenerate_question(state: InterviewState, config: RunnableConfig):
+
+    """ Node to generate a question (async) """
+
+    question = await rate_limit.ainvoke(llm, question_messages(state), config, priority=state.get("priority", 0))
+    return {"messages": [question]}
+
 # Search query writing
 search_instructions = SystemMessage(content=f"""You will be given a conversation between an analyst and an expert. 
 
@@ -154,51 +193,74 @@ Pay particular attention to the final question posed by the analyst.
 
 Convert this final question into a well-structured web search query""")
 
-def search_web(state: InterviewState):
+# Both retrievers search on the same conversation, so the query is generated once and shared
+search_query_cache = query_cache.QueryCache()
+
+def generate_search_query(state: InterviewState, config: RunnableConfig) -> SearchQuery:
     
-    """ Retrieve docs from web search """
+    """ Write a search query for the conversation, shared by search_web and search_wikipedia """
 
-    # Search
-    tavily_search = TavilySearchResults(max_results=3)
+    messages = [search_instructions]+state['messages']
+    structured_llm = llm.with_structured_output(SearchQuery)
+    return search_query_cache.get_or_create(
+        messages, lambda: rate_limit.invoke(structured_llm, messages, config, priority=state.get("priority", 0))
+    )
 
-    # Search query
+async def agenerate_search_query(state: InterviewState, config: RunnableConfig) -> SearchQuery:
+    
+    """ Write a search query for the conversation, shared by search_web and search_wikipedia (async) """
+
+    messages = [search_instructions]+state['messages']
     structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions]+state['messages'])
+    return await search_query_cache.aget_or_create(
+        messages, lambda: rate_limit.ainvoke(structured_llm, messages, config, priority=state.get("priority", 0))
+    )
+
+# Retrievers, backed by the on-disk retrieval cache
+web_retriever = retrievers.CachedRetriever(retrievers.TavilyRetriever(max_results=3))
+wikipedia_retriever = retrievers.CachedRetriever(retrievers.WikipediaRetriever(load_max_docs=2))
+
+def search_web(state: InterviewState, config: RunnableConfig):
+    
+    """ Retrieve docs from web search """
+
+    # Search query
+    search_query = generate_search_query(state, config)
     
     # Search
-    search_docs = tavily_search.invoke(search_query.search_query)
-
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    search_docs = web_retriever.search(search_query.search_query)
 
-    return {"context": [formatted_search_docs]} 
+    # Score against the query for the context reducer
+    return {"context": context_window.score_documents(search_query.search_query, search_docs)} 
 
-def search_wikipedia(state: InterviewState):
+async def asearch_web(state: InterviewState, config: RunnableConfig):
+    
+    """ Retrieve docs from web search (async) """
+
+    search_query = await agenerate_search_query(state, config)
+    search_docs = await web_retriever.asearch(search_query.search_query)
+    return {"context": context_window.score_documents(search_query.search_query, search_docs)} 
+
+def search_wikipedia(state: InterviewState, config: RunnableConfig):
     
     """ Retrieve docs from wikipedia """
 
     # Search query
-    structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions]+state['messages'])
+    search_query = generate_search_query(state, config)
     
     # Search
-    search_docs = WikipediaLoader(query=search_query.search_query, 
-                                  load_max_docs=2).load()
-
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    search_docs = wikipedia_retriever.search(search_query.search_query)
+
+    # Score against the query for the context reducer
+    return {"context": context_window.score_documents(search_query.search_query, search_docs)} 
 
-    return {"context": [formatted_search_docs]} 
+async def asearch_wikipedia(state: InterviewState, config: RunnableConfig):
+    
+    """ Retrieve docs from wikipedia (async) """
+
+    search_query = await agenerate_search_query(state, config)
+    search_docs = await wikipedia_retriever.asearch(search_query.search_query)
+    return {"context": context_window.score_documents(search_query.search_query, search_docs)} 
 
 # Generate expert answer
 answer_instructions = """You are an expert being interviewed by an analyst.
@@ -229,24 +291,49 @@ When answering questions, follow these guidelines:
         
 And skip the addition of the brackets as well as the Document source preamble in your citation."""
 
-def generate_answer(state: InterviewState):
+def answer_messages(state: InterviewState, config: RunnableConfig):
     
-    """ Node to answer a question """
+    """ Prompt for the expert, with the sources most relevant to the last question packed into the token budget """
 
-    # Get state
-    analyst = state["analyst"]
+    budget = configuration.Configuration.from_runnable_config(config).context_token_budget
     messages = state["messages"]
-    context = state["context"]
+    context = context_window.pack_context(messages[-1].content, state["context"], budget)
+    system_message = answer_instructions.format(goals=state["analyst"].persona, context=context_window.format_documents(context))
+    return [SystemMessage(content=system_message)]+messages
+
+def track_answer(state: InterviewState, answer: AIMessage):
+    
+    """ State update for an expert answer: the message plus running counts of answers and sources """
 
-    # Answer question
-    system_message = answer_instructions.format(goals=analyst.persona, context=context)
-    answer = llm.invoke([SystemMessage(content=system_message)]+messages)
-            
     # Name the message as coming from the expert
     answer.name = "expert"
+
+    # Count the sources in context that earlier turns had not seen
+    seen_sources = state.get("seen_sources", [])
+    new_sources = [key for key in dict.fromkeys(context_window.source_key(doc) for doc in state["context"])
+                   if key not in seen_sources]
+
+    return {"messages": [answer],
+            "num_responses": state.get("num_responses", 0) + 1,
+            "seen_sources": seen_sources + new_sources,
+            "new_sources": len(new_sources)}
+
+def generate_answer(state: InterviewState, config: RunnableConfig):
+    
+    """ Node to answer a question """
+
+    # Answer question
+    answer = rate_limit.invoke(llm, answer_messages(state, config), config, priority=state.get("priority", 0))
     
     # Append it to state
-    return {"messages": [answer]}
+    return track_answer(state, answer)
+
+async def agenerate_answer(state: InterviewState, config: RunnableConfig):
+    
+    """ Node to answer a question (async) """
+
+    answer = await rate_limit.ainvoke(llm, answer_messages(state, config), config, priority=state.get("priority", 0))
+    return track_answer(state, answer)
 
 def save_interview(state: InterviewState):
     
@@ -261,29 +348,16 @@ def save_interview(state: InterviewState):
     # Save to interviews key
     return {"interview": interview}
 
-def route_messages(state: InterviewState, 
-                   name: str = "expert"):
+def route_messages(state: InterviewState, config: RunnableConfig):
 
     """ Route between question and answer """
     
-    # Get messages
-    messages = state["messages"]
-    max_num_turns = state.get('max_num_turns',2)
-
-    # Check the number of expert answers 
-    num_responses = len(
-        [m for m in messages if isinstance(m, AIMessage) and m.name == name]
-    )
-
-    # End if expert has answered more than the max turns
-    if num_responses >= max_num_turns:
-        return 'save_interview'
-
     # This router is run after each question - answer pair 
-    # Get the last question asked to check if it signals the end of discussion
-    last_question = messages[-2]
-    
-    if "Thank you so much for your help" in last_question.content:
+    policy = interview_policy.InterviewPolicy.from_runnable_config(config, max_num_turns=state.get('max_num_turns',2))
+
+    # End on the turn cap, the analyst's closing phrase (in the last question asked), or when the turn brought no new sources
+    last_question = state["messages"][-2]
+    if policy.should_stop(state.get("num_responses", 0), state.get("new_sources", 0), last_question.content):
         return 'save_interview'
     return "ask_question"
 
@@ -339,40 +413,84 @@ There should be no redundant sources. It should simply be:
 - Include no preamble before the title of the report
 - Check that all guidelines have been followed"""
 
-def write_section(state: InterviewState):
+# Tokens of summary kept in each section digest
+SECTION_DIGEST_TOKENS = 80
 
-    """ Node to write a section """
+def digest_section(section: str, max_tokens: int = SECTION_DIGEST_TOKENS) -> dict:
+
+    """ Title and opening sentences of a section, used for the introduction and conclusion instead of the full text """
+
+    lines = section.strip().splitlines()
+    title = next((line for line in lines if line.startswith("## ")), lines[0] if lines else "")
 
-    # Get state
-    interview = state["interview"]
-    context = state["context"]
+    # The summary is the text between "### Summary" and "### Sources" (or everything after the title)
+    body = section.split("### Summary", 1)[1] if "### Summary" in section else section.replace(title, "", 1)
+    body = body.split("### Sources", 1)[0]
+    sentences = re.split(r"(?<=[.!?])\s+", " ".join(body.split()))
+    summary, summary_tokens = [], 0
+    for sentence in sentences:
+        tokens = context_window.count_tokens(sentence)
+        if summary and summary_tokens + tokens > max_tokens:
+            break
+        summary.append(sentence)
+        summary_tokens += tokens
+
+    return {
+        "title": title,
+        "summary": " ".join(summary),
+        "tokens": context_window.count_tokens(section),
+        "digest_tokens": context_window.count_tokens(title) + summary_tokens,
+    }
+
+def section_messages(state: InterviewState, config: RunnableConfig):
+
+    """ Prompt for the section writer, with the sources most relevant to the analyst's focus packed into the token budget """
+
+    budget = configuration.Configuration.from_runnable_config(config).context_token_budget
     analyst = state["analyst"]
-   
-    # Write section using either the gathered source docs from interview (context) or the interview itself (interview)
+    context = context_window.pack_context(analyst.description, state["context"], budget)
     system_message = section_writer_instructions.format(focus=analyst.description)
-    section = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Use this source to write your section: {context}")]) 
+    return [SystemMessage(content=system_message)]+[HumanMessage(content=f"Use this source to write your section: {context_window.format_documents(context)}")]
+
+def write_section(state: InterviewState, config: RunnableConfig):
+
+    """ Node to write a section """
+
+    # Write section using the gathered source docs from interview (context)
+    section = rate_limit.invoke(llm, section_messages(state, config), config, priority=state.get("priority", 0)) 
                 
-    # Append it to state
-    return {"sections": [section.content]}
-
-# Add nodes and edges 
-interview_builder = StateGraph(InterviewState)
-interview_builder.add_node("ask_question", generate_question)
-interview_builder.add_node("search_web", search_web)
-interview_builder.add_node("search_wikipedia", search_wikipedia)
-interview_builder.add_node("answer_question", generate_answer)
-interview_builder.add_node("save_interview", save_interview)
-interview_builder.add_node("write_section", write_section)
-
-# Flow
-interview_builder.add_edge(START, "ask_question")
-interview_builder.add_edge("ask_question", "search_web")
-interview_builder.add_edge("ask_question", "search_wikipedia")
-interview_builder.add_edge("search_web", "answer_question")
-interview_builder.add_edge("search_wikipedia", "answer_question")
-interview_builder.add_conditional_edges("answer_question", route_messages,['ask_question','save_interview'])
-interview_builder.add_edge("save_interview", "write_section")
-interview_builder.add_edge("write_section", END)
+    # Append it to state, with its digest computed once here
+    return {"sections": [section.content], "section_digests": [digest_section(section.content)]}
+
+async def awrite_section(state: InterviewState, config: RunnableConfig):
+
+    """ Node to write a section (async) """
+
+    section = await rate_limit.ainvoke(llm, section_messages(state, config), config, priority=state.get("priority", 0)) 
+    return {"sections": [section.content], "section_digests": [digest_section(section.content)]}
+
+def build_interview_graph(nodes: dict):
+
+    """ Add nodes and edges of the interview sub-graph, given the node functions by name """
+
+    interview_builder = StateGraph(InterviewState, config_schema=configuration.Configuration)
+    interview_builder.add_node("ask_question", nodes["ask_question"])
+    interview_builder.add_node("search_web", nodes["search_web"])
+    interview_builder.add_node("search_wikipedia", nodes["search_wikipedia"])
+    interview_builder.add_node("answer_question", nodes["answer_question"])
+    interview_builder.add_node("save_interview", save_interview)
+    interview_builder.add_node("write_section", nodes["write_section"])
+
+    # Flow
+    interview_builder.add_edge(START, "ask_question")
+    interview_builder.add_edge("ask_question", "search_web")
+    interview_builder.add_edge("ask_question", "search_wikipedia")
+    interview_builder.add_edge("search_web", "answer_question")
+    interview_builder.add_edge("search_wikipedia", "answer_question")
+    interview_builder.add_conditional_edges("answer_question", route_messages,['ask_question','save_interview'])
+    interview_builder.add_edge("save_interview", "write_section")
+    interview_builder.add_edge("write_section", END)
+    return interview_builder
 
 def initiate_all_interviews(state: ResearchGraphState):
 
@@ -385,13 +503,15 @@ def initiate_all_interviews(state: ResearchGraphState):
         return "create_analysts"
 
     # Otherwise kick off interviews in parallel via Send() API
+    # Earlier analysts get a higher priority so that, under rate limits, interviews finish one after another rather than all at the end
     else:
         topic = state["topic"]
         return [Send("conduct_interview", {"analyst": analyst,
+                                           "priority": priority,
                                            "messages": [HumanMessage(
                                                content=f"So you said you were writing an article on {topic}?"
                                            )
-                                                       ]}) for analyst in state["analysts"]]
+                                                       ]}) for priority, analyst in enumerate(state["analysts"])]
 
 # Write a report based on the interviews
 report_writer_instructions = """You are a technical writer creating a report on this overall topic: 
@@ -428,9 +548,36 @@ Here are the memos from your analysts to build your report from:
 
 {context}"""
 
-def write_report(state: ResearchGraphState):
+def stream_section(section: str, messages, config: RunnableConfig) -> str:
 
-    """ Node to write the final report body """
+    """ Stream the LLM response as custom stream events tagged with the report section, and return the full text
+
+    Use report_stream.stream_report to assemble the report from these events on the client
+    """
+
+    writer = get_stream_writer()
+    content = ""
+    for chunk in rate_limit.stream(llm, messages, config):
+        content += chunk.content
+        writer({"section": section, "delta": chunk.content})
+    writer({"section": section, "done": True})
+    return content
+
+async def astream_section(section: str, messages, config: RunnableConfig) -> str:
+
+    """ Stream the LLM response as custom stream events tagged with the report section, and return the full text (async) """
+
+    writer = get_stream_writer()
+    content = ""
+    async for chunk in rate_limit.astream(llm, messages, config):
+        content += chunk.content
+        writer({"section": section, "delta": chunk.content})
+    writer({"section": section, "done": True})
+    return content
+
+def report_messages(state: ResearchGraphState):
+
+    """ Prompt for the report writer """
 
     # Full set of sections
     sections = state["sections"]
@@ -441,13 +588,26 @@ def write_report(state: ResearchGraphState):
     
     # Summarize the sections into a final report
     system_message = report_writer_instructions.format(topic=topic, context=formatted_str_sections)    
-    report = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Write a report based upon these memos.")]) 
-    return {"content": report.content}
+    return [SystemMessage(content=system_message)]+[HumanMessage(content=f"Write a report based upon these memos.")]
+
+def write_report(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the final report body """
+
+    report = stream_section("content", report_messages(state), config) 
+    return {"content": report}
+
+async def awrite_report(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the final report body (async) """
+
+    report = await astream_section("content", report_messages(state), config) 
+    return {"content": report}
 
 # Write the introduction or conclusion
 intro_conclusion_instructions = """You are a technical writer finishing a report on {topic}
 
-You will be given all of the sections of the report.
+You will be given a digest of each section of the report: its title and opening summary.
 
 You job is to write a crisp and compelling introduction or conclusion section.
 
@@ -467,80 +627,117 @@ For your conclusion, use ## Conclusion as the section header.
 
 Here are the sections to reflect on for writing: {formatted_str_sections}"""
 
-def write_introduction(state: ResearchGraphState):
+def format_section_digests(state: ResearchGraphState):
 
-    """ Node to write the introduction """
+    """ Concat the section digests, which are much shorter than the full sections """
 
-    # Full set of sections
-    sections = state["sections"]
-    topic = state["topic"]
+    digests = state.get("section_digests") or [digest_section(section) for section in state["sections"]]
+    return "\n\n".join(f"{digest['title']}\n{digest['summary']}" for digest in digests)
 
-    # Concat all sections together
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
+def intro_conclusion_messages(state: ResearchGraphState, part: str):
+
+    """ Prompt for writing the report's `part`, "introduction" or "conclusion" """
+
+    # Digest of each section
+    topic = state["topic"]
+    formatted_str_sections = format_section_digests(state)
     
     # Summarize the sections into a final report
     
     instructions = intro_conclusion_instructions.format(topic=topic, formatted_str_sections=formatted_str_sections)    
-    intro = llm.invoke([instructions]+[HumanMessage(content=f"Write the report introduction")]) 
-    return {"introduction": intro.content}
+    return [instructions]+[HumanMessage(content=f"Write the report {part}")]
+
+def write_introduction(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the introduction """
 
-def write_conclusion(state: ResearchGraphState):
+    intro = stream_section("introduction", intro_conclusion_messages(state, "introduction"), config) 
+    return {"introduction": intro}
+
+async def awrite_introduction(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the introduction (async) """
+
+    intro = await astream_section("introduction", intro_conclusion_messages(state, "introduction"), config) 
+    return {"introduction": intro}
+
+def write_conclusion(state: ResearchGraphState, config: RunnableConfig):
 
     """ Node to write the conclusion """
 
-    # Full set of sections
-    sections = state["sections"]
-    topic = state["topic"]
+    conclusion = stream_section("conclusion", intro_conclusion_messages(state, "conclusion"), config) 
+    return {"conclusion": conclusion}
 
-    # Concat all sections together
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
-    
-    # Summarize the sections into a final report
-    
-    instructions = intro_conclusion_instructions.format(topic=topic, formatted_str_sections=formatted_str_sections)    
-    conclusion = llm.invoke([instructions]+[HumanMessage(content=f"Write the report conclusion")]) 
-    return {"conclusion": conclusion.content}
+async def awrite_conclusion(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the conclusion (async) """
+
+    conclusion = await astream_section("conclusion", intro_conclusion_messages(state, "conclusion"), config) 
+    return {"conclusion": conclusion}
 
 def finalize_report(state: ResearchGraphState):
 
     """ The is the "reduce" step where we gather all the sections, combine them, and reflect on them to write the intro/conclusion """
 
-    # Save full final report
-    content = state["content"]
-    if content.startswith("## Insights"):
-        content = content.strip("## Insights")
-    if "## Sources" in content:
-        try:
-            content, sources = content.split("\n## Sources\n")
-        except:
-            sources = None
-    else:
-        sources = None
-
-    final_report = state["introduction"] + "\n\n---\n\n" + content + "\n\n---\n\n" + state["conclusion"]
-    if sources is not None:
-        final_report += "\n\n## Sources\n" + sources
+    # Save full final report (the same assembly report_stream applies to the streamed sections)
+    final_report = report_stream.assemble_report(state["introduction"], state["content"], state["conclusion"])
     return {"final_report": final_report}
 
-# Add nodes and edges 
-builder = StateGraph(ResearchGraphState)
-builder.add_node("create_analysts", create_analysts)
-builder.add_node("human_feedback", human_feedback)
-builder.add_node("conduct_interview", interview_builder.compile())
-builder.add_node("write_report",write_report)
-builder.add_node("write_introduction",write_introduction)
-builder.add_node("write_conclusion",write_conclusion)
-builder.add_node("finalize_report",finalize_report)
-
-# Logic
-builder.add_edge(START, "create_analysts")
-builder.add_edge("create_analysts", "human_feedback")
-builder.add_conditional_edges("human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"])
-builder.add_edge("conduct_interview", "write_report")
-builder.add_edge("conduct_interview", "write_introduction")
-builder.add_edge("conduct_interview", "write_conclusion")
-builder.add_edge(["write_conclusion", "write_report", "write_introduction"], "finalize_report")
-builder.add_edge("finalize_report", END)
+def build_research_graph(nodes: dict, interview_graph):
+
+    """ Add nodes and edges of the research graph, given the node functions by name and the compiled interview sub-graph """
+
+    builder = StateGraph(ResearchGraphState, config_schema=configuration.Configuration)
+    builder.add_node("create_analysts", nodes["create_analysts"])
+    builder.add_node("human_feedback", human_feedback)
+    builder.add_node("conduct_interview", interview_graph)
+    builder.add_node("write_report", nodes["write_report"])
+    builder.add_node("write_introduction", nodes["write_introduction"])
+    builder.add_node("write_conclusion", nodes["write_conclusion"])
+    builder.add_node("finalize_report", finalize_report)
+
+    # Logic
+    builder.add_edge(START, "create_analysts")
+    builder.add_edge("create_analysts", "human_feedback")
+    builder.add_conditional_edges("human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"])
+    builder.add_edge("conduct_interview", "write_report")
+    builder.add_edge("conduct_interview", "write_introduction")
+    builder.add_edge("conduct_interview", "write_conclusion")
+    builder.add_edge(["write_conclusion", "write_report", "write_introduction"], "finalize_report")
+    builder.add_edge("finalize_report", END)
+    return builder
+
+# Sync graph: parallel interviews run on a thread pool
+interview_builder = build_interview_graph({
+    "ask_question": generate_question,
+    "search_web": search_web,
+    "search_wikipedia": search_wikipedia,
+    "answer_question": generate_answer,
+    "write_section": write_section,
+})
+builder = build_research_graph({
+    "create_analysts": create_analysts,
+    "write_report": write_report,
+    "write_introduction": write_introduction,
+    "write_conclusion": write_conclusion,
+}, interview_builder.compile())
 
 # Compile
-graph = builder.compile(interrupt_before=['human_feedback'])
\ No newline at end of file
+graph = builder.compile(interrupt_before=['human_feedback'])
+
+# Async graph: run with ainvoke / astream so that all interviews share one event loop
+async_interview_builder = build_interview_graph({
+    "ask_question": agenerate_question,
+    "search_web": asearch_web,
+    "search_wikipedia": asearch_wikipedia,
+    "answer_question": agenerate_answer,
+    "write_section": awrite_section,
+})
+async_builder = build_research_graph({
+    "create_analysts": acreate_analysts,
+    "write_report": awrite_report,
+    "write_introduction": awrite_introduction,
+    "write_conclusion": awrite_conclusion,
+}, async_interview_builder.compile())
+
+async_graph = async_builder.compile(interrupt_before=['human_feedback'])
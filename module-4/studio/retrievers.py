@@ -0,0 +1,243 @@
+""" Retrievers used by the research graphs, and an on-disk cache in front of them
+
+Every retriever exposes the same small interface: a `source` name plus
+`search(query)` / `asearch(query)` returning a list of Documents. Wrapping one in
+CachedRetriever serves repeated (normalized) queries from a SQLite cache with
+TTL expiry and LRU eviction. StubRetriever returns canned documents so the
+graphs and the cache can be exercised offline.
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import WikipediaLoader
+from langchain_community.tools.tavily_search import TavilySearchResults
+
+### Retriever interface
+
+class Retriever:
+    """Search a single source for documents relevant to a query."""
+
+    # Name of the source, used as part of the cache key
+    source: str = "retriever"
+
+    def search(self, query: str) -> List[Document]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str) -> List[Document]:
+        # Fall back to running the sync search on a worker thread
+        return await asyncio.to_thread(self.search, query)
+
+### Web search
+
+class TavilyRetriever(Retriever):
+    """Web search with Tavily. Documents carry the result url in `metadata["url"]`."""
+
+    def __init__(self, max_results: int = 3):
+        self.max_results = max_results
+        self.source = f"tavily:{max_results}"
+
+    @staticmethod
+    def _to_documents(results: List[dict]) -> List[Document]:
+        return [Document(page_content=result["content"], metadata={"url": result["url"]}) for result in results]
+
+    def search(self, query: str) -> List[Document]:
+        return self._to_documents(TavilySearchResults(max_results=self.max_results).invoke(query))
+
+    async def asearch(self, query: str) -> List[Document]:
+        # Uses the async Tavily client
+        return self._to_documents(await TavilySearchResults(max_results=self.max_results).ainvoke(query))
+
+### Wikipedia
+
+class WikipediaRetriever(Retriever):
+    """Top Wikipedia pages for a query. Documents carry the page url in `metadata["source"]`."""
+
+    def __init__(self, load_max_docs: int = 2):
+        self.load_max_docs = load_max_docs
+        self.source = f"wikipedia:{load_max_docs}"
+
+    def search(self, query: str) -> List[Document]:
+        # The wikipedia client has no async API, so asearch runs this on a worker thread
+        return WikipediaLoader(query=query, load_max_docs=self.load_max_docs).load()
+
+### Offline stub
+
+class StubRetriever(Retriever):
+    """Deterministic canned documents for a query, after sleeping `latency` seconds.
+
+    `metadata_key` is "url" to stand in for Tavily and "source" for Wikipedia.
+    `calls` counts the searches that reached the stub (i.e. cache misses).
+    """
+
+    def __init__(self, source: str = "stub", num_docs: int = 2, latency: float = 0.0, metadata_key: str = "source"):
+        self.source = source
+        self.num_docs = num_docs
+        self.latency = latency
+        self.metadata_key = metadata_key
+        self.calls = 0
+
+    def _documents(self, query: str) -> List[Document]:
+        self.calls += 1
+        slug = normalize_query(query).replace(" ", "_")
+        return [Document(page_content=f"{self.source} result {i} for {query}",
+                         metadata={self.metadata_key: f"https://{self.source}.example.com/{slug}/{i}"})
+                for i in range(self.num_docs)]
+
+    def search(self, query: str) -> List[Document]:
+        time.sleep(self.latency)
+        return self._documents(query)
+
+    async def asearch(self, query: str) -> List[Document]:
+        await asyncio.sleep(self.latency)
+        return self._documents(query)
+
+### Persistent cache
+
+def normalize_query(query: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace so near-identical queries share a key"""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"[^\w\s]", " ", query)
+    return " ".join(query.split())
+
+class RetrievalCache:
+    """SQLite-backed cache of retrieved documents keyed by (source, normalized query).
+
+    Entries older than `ttl_seconds` are treated as misses and removed. Once more
+    than `max_entries` are stored, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = ":memory:", ttl_seconds: float = 24 * 60 * 60, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS retrieval_cache (
+            source TEXT NOT NULL,
+            query TEXT NOT NULL,
+            documents TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (source, query)
+        )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS retrieval_cache_accessed ON retrieval_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, source: str, query: str) -> Optional[List[Document]]:
+        key = (source, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT documents, created_at FROM retrieval_cache WHERE source = ? AND query = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            documents, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM retrieval_cache WHERE source = ? AND query = ?", key)
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE retrieval_cache SET accessed_at = ? WHERE source = ? AND query = ?", (now, *key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in json.loads(documents)]
+
+    def put(self, source: str, query: str, documents: List[Document]):
+        payload = json.dumps([{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents])
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?, ?)",
+                (source, normalize_query(query), payload, now, now),
+            )
+            # Evict the least recently used entries beyond the size bound
+            evicted = self._conn.execute(
+                """DELETE FROM retrieval_cache WHERE rowid IN (
+                    SELECT rowid FROM retrieval_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,)
+            ).rowcount
+            self._conn.commit()
+            self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM retrieval_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+_default_cache: Optional[RetrievalCache] = None
+_default_cache_lock = threading.Lock()
+
+def default_cache_path() -> str:
+    """retrieval_cache.sqlite in the user's cache directory ($XDG_CACHE_HOME, else ~/.cache)"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "langchain-academy", "retrieval_cache.sqlite")
+
+def get_default_cache() -> RetrievalCache:
+    """Process-wide cache, stored at $RETRIEVAL_CACHE_PATH (default: default_cache_path())"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            path = os.environ.get("RETRIEVAL_CACHE_PATH") or default_cache_path()
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            _default_cache = RetrievalCache(
+                path=path,
+                ttl_seconds=float(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", 24 * 60 * 60)),
+                max_entries=int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", 10_000)),
+            )
+        return _default_cache
+
+class CachedRetriever(Retriever):
+    """Serve searches from a RetrievalCache, falling through to `retriever` on a miss."""
+
+    def __init__(self, retriever: Retriever, cache: Optional[RetrievalCache] = None):
+        self.retriever = retriever
+        self.source = retriever.source
+        self._cache = cache
+
+    @property
+    def cache(self) -> RetrievalCache:
+        # The default cache is opened on first use rather than at import time
+        return self._cache or get_default_cache()
+
+    def search(self, query: str) -> List[Document]:
+        documents = self.cache.get(self.source, query)
+        if documents is None:
+            documents = self.retriever.search(query)
+            self.cache.put(self.source, query, documents)
+        return documents
+
+    async def asearch(self, query: str) -> List[Document]:
+        # SQLite calls block, so keep them off the event loop
+        documents = await asyncio.to_thread(self.cache.get, self.source, query)
+        if documents is None:
+            documents = await self.retriever.asearch(query)
+            await asyncio.to_thread(self.cache.put, self.source, query, documents)
+        return documents
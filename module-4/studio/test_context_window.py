@@ -0,0 +1,30 @@
+from langchain_core.documents import Document
+
+import context_window
+
+def doc(url, text, relevance):
+    return Document(page_content=text, metadata={"url": url, "tokens": len(text.split()), "relevance": relevance})
+
+def test_keeps_one_copy_per_source():
+    reducer = context_window.context_reducer(max_tokens=1000)
+    context = reducer([doc("a", "old text", 0.2), doc("b", "other", 0.5)], [doc("a", "new text", 0.9)])
+    assert [d.metadata["url"] for d in context] == ["a", "b"]
+    assert context[0].page_content == "new text"
+
+def test_less_relevant_duplicate_does_not_replace():
+    reducer = context_window.context_reducer(max_tokens=1000)
+    context = reducer([doc("a", "kept", 0.9)], [doc("a", "dropped", 0.1)])
+    assert [d.page_content for d in context] == ["kept"]
+
+def test_evicts_least_relevant_then_oldest_within_budget():
+    reducer = context_window.context_reducer(max_tokens=6)
+    left = [doc("a", "one two", 0.5), doc("b", "three four", 0.1)]
+    right = [doc("c", "five six", 0.1), doc("d", "seven eight", 0.9)]
+    context = reducer(left, right)
+    assert [d.metadata["url"] for d in context] == ["a", "c", "d"]
+    assert sum(d.metadata["tokens"] for d in context) <= 6
+
+def test_scored_documents_carry_tokens_and_relevance():
+    [scored] = context_window.score_documents("graph memory", [Document(page_content="Memory in a graph.", metadata={"url": "x"})])
+    assert scored.metadata["relevance"] == 1.0
+    assert scored.metadata["tokens"] == 5
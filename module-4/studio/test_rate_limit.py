@@ -0,0 +1,42 @@
+import asyncio
+
+import configuration
+import rate_limit
+
+def test_waiting_calls_are_granted_in_priority_order():
+    async def run():
+        limiter = rate_limit.RateLimiter(max_concurrency=1)
+        held = await limiter.aacquire(tokens=0)
+        granted = []
+
+        async def call(priority):
+            ticket = await limiter.aacquire(tokens=0, priority=priority)
+            granted.append(priority)
+            limiter.release(ticket)
+
+        tasks = [asyncio.create_task(call(priority)) for priority in (3, 1, 2, 0)]
+        await asyncio.sleep(0.05)
+        assert granted == []
+        limiter.release(held)
+        await asyncio.gather(*tasks)
+        return granted
+
+    assert asyncio.run(run()) == [0, 1, 2, 3]
+
+def test_requests_per_minute_holds_back_the_next_call():
+    limiter = rate_limit.RateLimiter(requests_per_minute=60)
+    limiter.requests.level = 1
+    limiter.release(limiter.acquire(tokens=0))
+    assert limiter._wait_time(rate_limit.Ticket(0, 0, 0, lambda: None)) > 0.5
+
+def test_token_reservation_is_settled_against_usage():
+    limiter = rate_limit.RateLimiter(tokens_per_minute=6000)
+    ticket = limiter.acquire(tokens=1000)
+    limiter.release(ticket, used_tokens=200)
+    assert limiter.tokens.level > 5700
+
+def test_limits_from_environment_are_cast(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENCY", "4")
+    config = configuration.Configuration.from_runnable_config({"configurable": {"requests_per_minute": 30}})
+    assert config.max_concurrency == 4
+    assert config.requests_per_minute == 30
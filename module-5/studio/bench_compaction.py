@@ -0,0 +1,82 @@
+""" Memory counts, tokens and run time of the memory_compaction job
+
+Usage:
+    python bench_compaction.py --facts 200 2000 --copies 3 --threshold 0.85
+
+Builds a ("memories", user_id) namespace the way months of Trustcall inserts
+do: --facts distinct facts, each stored up to --copies times with the small
+rewordings an extractor produces ("The user ...", punctuation, case, a
+restated clause). Compacts it without a merge step, so copies that add words
+of their own are kept, and reports the memories (with those kept copies) and
+the tokens of the system prompt and of the Trustcall `existing` payload before
+and after, the job's run time, and the facts merged into a different fact
+(false merges).
+"""
+import argparse
+import random
+import time
+
+from langgraph.store.memory import InMemoryStore
+
+import compaction
+
+NAMESPACE = ("memories", "bench-user")
+
+SUBJECTS = ["sister", "brother", "mother", "father", "friend", "coworker", "manager", "neighbor", "cousin", "partner",
+            "dog", "cat", "landlord", "dentist", "coach", "mentor", "roommate", "boss", "aunt", "uncle"]
+PLACES = ["Paris", "Lisbon", "Tokyo", "Denver", "Austin", "Berlin", "Seoul", "Toronto", "Nairobi", "Lima",
+          "Oslo", "Cairo", "Dublin", "Quito", "Hanoi", "Perth", "Zurich", "Accra", "Osaka", "Bogota"]
+ACTIVITIES = ["sushi", "jazz", "hiking", "chess", "pottery", "running", "baking", "cycling", "podcasts", "gardening",
+              "climbing", "yoga", "photography", "tennis", "painting", "surfing", "knitting", "karaoke", "rowing", "origami"]
+FACT_TEMPLATES = [
+    "User's {subject} lives in {place} and loves {activity}",
+    "User goes {activity} with their {subject} in {place}",
+    "User wants to visit {place} with their {subject} for {activity}",
+]
+REWORDINGS = [
+    lambda fact: fact,
+    lambda fact: fact + ".",
+    lambda fact: "The " + fact[0].lower() + fact[1:],
+    lambda fact: fact.lower(),
+    lambda fact: fact + ", as they mentioned",
+]
+
+def collection(facts: int, copies: int, rng: random.Random) -> list[tuple[str, str, int]]:
+    """(key, content, fact id) of the stored memories"""
+    combinations = [(template, subject, place, activity) for template in FACT_TEMPLATES for subject in SUBJECTS
+                    for place in PLACES for activity in ACTIVITIES]
+    memories = []
+    for fact_id, (template, subject, place, activity) in enumerate(rng.sample(combinations, facts)):
+        fact = template.format(subject=subject, place=place, activity=activity)
+        for copy in range(rng.randint(1, copies)):
+            memories.append((f"{fact_id}-{copy}", rng.choice(REWORDINGS)(fact), fact_id))
+    rng.shuffle(memories)
+    return memories
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facts", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--copies", type=int, default=3, help="Most copies of a fact")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'facts':>6} {'memories':>17} {'kept details':>13} {'prompt tokens':>17} {'existing tokens':>17} {'seconds':>8} "
+          f"{'false merges':>13}")
+    for facts in args.facts:
+        memories = collection(facts, args.copies, random.Random(args.seed))
+        store = InMemoryStore()
+        for key, content, _ in memories:
+            store.put(NAMESPACE, key, {"content": content})
+
+        start = time.perf_counter()
+        report = compaction.compact(store, NAMESPACE, args.threshold, dry_run=False)
+        seconds = time.perf_counter() - start
+
+        # Keys of the same fact share their prefix; a kept memory per fact means no fact was merged into another
+        kept_facts = [item.key.split("-")[0] for item in store.search(NAMESPACE, limit=len(memories))]
+        false_merges = facts - len(set(kept_facts))
+        print(f"{facts:>6} {report['memories_before']:>8} -> {report['memories_after']:<6} {report['kept_with_details']:>13} "
+              f"{report['prompt_tokens_before']:>7} -> {report['prompt_tokens_after']:<7} "
+              f"{report['existing_tokens_before']:>7} -> {report['existing_tokens_after']:<7} "
+              f"{seconds:>8.2f} {false_merges:>13}")
@@ -0,0 +1,119 @@
+""" Recall and latency of semantic memory retrieval at growing collection sizes
+
+Usage:
+    python bench_memory_retrieval.py --memories 1000 10000 100000 --queries 20 --k 5
+
+Fills a user's ("memories", user_id) namespace with synthetic Memory items:
+filler memories built from templates over shared vocabularies, plus --queries
+target memories that each mention a distinct person. Each query asks about
+one target in other words, and recall@k is the fraction of queries whose
+target is among the k memories put in the prompt. Each memory_retrieval mode
+of memoryschema_collection's call_model is measured:
+- all: store.search(namespace), the first page of the namespace
+- semantic: ranked in process; latency is reported cold (no cached
+  embeddings, as after a restart) and warm (every embedding cached, as on
+  later turns)
+- store_index: ranked by an InMemoryStore indexed with retrieval.embed_texts,
+  as langgraph.json configures the deployment's store; the embeddings are
+  computed when the memories are put, which is timed separately
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langgraph.store.memory import InMemoryStore
+
+import retrieval
+
+NAMESPACE = ("memories", "bench-user")
+
+PEOPLE = ["sister", "brother", "mother", "father", "friend", "coworker", "manager", "neighbor", "cousin", "partner"]
+CITIES = ["Paris", "Lisbon", "Tokyo", "Denver", "Austin", "Berlin", "Seoul", "Toronto", "Nairobi", "Lima"]
+THINGS = ["sushi", "jazz", "hiking", "chess", "pottery", "running", "baking", "cycling", "podcasts", "gardening",
+          "climbing", "yoga", "photography", "sci-fi novels", "board games", "coffee", "tennis", "painting"]
+FILLER_TEMPLATES = [
+    "User enjoys {thing} on weekends.",
+    "User's {person} lives in {city}.",
+    "User is planning a trip to {city} next year.",
+    "User started learning {thing} recently.",
+    "User's {person} recommended trying {thing}.",
+    "User dislikes {thing} but their {person} loves it.",
+]
+# (target memory, query about it): the queries share the person and one topic word with their target
+TARGET_TEMPLATES = [
+    ("User's {person} {name} is moving to {city} in the spring.", "When is my {person} {name} moving?"),
+    ("User's {person} {name} got them into {thing}.", "Who got me into {thing}? I think it was {name}."),
+    ("User owes {name} a birthday gift this month.", "What do I need to get for {name}'s birthday?"),
+    ("User and {name} are training for a marathon together.", "How is the marathon training with {name} going?"),
+]
+SYLLABLES = ["ka", "lo", "mi", "ra", "ze", "tu", "vo", "ni", "sha", "den", "bri", "quo", "fel", "pax", "ori"]
+
+def memories(n: int, targets: int, rng: random.Random) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """(key, content) of n memories and (target key, query) of `targets` queries"""
+    names = set()
+    while len(names) < targets:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize())
+    items, queries = [], []
+    for i, name in enumerate(sorted(names)):
+        memory, query = rng.choice(TARGET_TEMPLATES)
+        words = {"name": name, "person": rng.choice(PEOPLE), "city": rng.choice(CITIES), "thing": rng.choice(THINGS)}
+        items.append((f"target-{i}", memory.format(**words)))
+        queries.append((f"target-{i}", query.format(**words)))
+    for i in range(n - targets):
+        words = {"person": rng.choice(PEOPLE), "city": rng.choice(CITIES), "thing": rng.choice(THINGS)}
+        items.append((f"filler-{i}", rng.choice(FILLER_TEMPLATES).format(**words)))
+    rng.shuffle(items)
+    return items, queries
+
+def measure(queries: list[tuple[str, str]], retrieve) -> tuple[float, list[float]]:
+    """Recall of the targets in what `retrieve(query)` returns, and the latency of each query in seconds"""
+    latencies, hits = [], 0
+    for key, query in queries:
+        start = time.perf_counter()
+        top = retrieve(query)
+        latencies.append(time.perf_counter() - start)
+        hits += key in {item.key for item in top}
+    return hits / len(queries), latencies
+
+def run(n: int, num_queries: int, k: int, seed: int) -> dict:
+    items, queries = memories(n, num_queries, random.Random(seed))
+    store = InMemoryStore()
+    indexed_store = InMemoryStore(index={"embed": retrieval.embed_texts, "dims": retrieval.INDEX_DIMS, "fields": ["content"]})
+    for key, content in items:
+        store.put(NAMESPACE, key, {"content": content})
+    start = time.perf_counter()
+    for key, content in items:
+        indexed_store.put(NAMESPACE, key, {"content": content})
+    index_seconds = time.perf_counter() - start
+
+    results = {"memories": n}
+    recall, latencies = measure(queries, lambda query: store.search(NAMESPACE))
+    results["all"] = {"recall": recall, "ms": statistics.median(latencies) * 1000}
+
+    retrieval.embeddings.clear()
+    recall, latencies = measure(queries, lambda query: retrieval.search(store, NAMESPACE, query, k))
+    # The first query embedded every memory; the others reused the cache
+    results["semantic"] = {"recall": recall, "cold_ms": latencies[0] * 1000, "ms": statistics.median(latencies[1:]) * 1000}
+
+    recall, latencies = measure(queries, lambda query: retrieval.search(indexed_store, NAMESPACE, query, k, use_index=True))
+    results["store_index"] = {"recall": recall, "ms": statistics.median(latencies) * 1000, "put_ms": index_seconds * 1000 / n}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'':>9} {'all':>20} {'semantic':>30} {'store_index':>31}")
+    print(f"{'memories':>9} {'recall':>9} {'ms':>10} {'recall':>9} {'cold ms':>10} {'warm ms':>10} "
+          f"{'recall':>9} {'ms':>10} {'put ms':>10}")
+    for n in args.memories:
+        result = run(n, args.queries, args.k, args.seed)
+        everything, semantic, indexed = result["all"], result["semantic"], result["store_index"]
+        print(f"{n:>9} {everything['recall']:>9.0%} {everything['ms']:>10.2f} "
+              f"{semantic['recall']:>9.0%} {semantic['cold_ms']:>10.1f} {semantic['ms']:>10.1f} "
+              f"{indexed['recall']:>9.0%} {indexed['ms']:>10.1f} {indexed['put_ms']:>10.3f}")
@@ -0,0 +1,100 @@
+""" Turn latency and extraction calls with inline versus deferred memory writing
+
+Usage:
+    python bench_memory_writer.py --users 8 --turns 5 --latency 0.2 --debounce 0.5
+
+Every user sends --turns messages back to back on their own thread through
+the chatbot_memory graph (memory_store.py), all users at once. The model is a
+stub that sleeps --latency seconds per call, for the reply and for the memory
+extraction alike. Reports the turn latency the user sees, the extraction calls
+made, and the time until every memory is written (after the writer is flushed
+in deferred mode), with the writer's stats.
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+
+import memory_store
+import memory_writer
+
+lock = threading.Lock()
+
+class SlowChatModel(BaseChatModel):
+    """Sleeps `latency` seconds, then replies; counts the memory extractions it is asked for."""
+
+    latency: float = 0.2
+    extractions: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        if "collecting information about the user" in str(messages[0].content):
+            with lock:
+                self.extractions += 1
+            content = "- " + "\n- ".join(str(message.content) for message in messages[1:] if message.type == "human")
+        else:
+            content = "Nice to hear from you."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+def run(mode: str, users: int, turns: int, latency: float, debounce: float) -> dict:
+    model = SlowChatModel(latency=latency)
+    memory_store.model = model
+    memory_writer.writer = memory_writer.MemoryWriter(debounce=debounce)
+    store = InMemoryStore()
+    graph = memory_store.builder.compile(checkpointer=MemorySaver(), store=store)
+
+    def conversation(user: int) -> list[float]:
+        config = {"configurable": {"thread_id": str(user), "user_id": f"user-{user}", "memory_write_mode": mode}}
+        latencies = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            graph.invoke({"messages": [("user", f"Fact {turn} about user {user}")]}, config)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        latencies = [latency for user_latencies in pool.map(conversation, range(users)) for latency in user_latencies]
+    replied = time.perf_counter() - start
+    memory_writer.writer.flush()
+    written = time.perf_counter() - start
+
+    # Every fact must have reached the store either way
+    missing = sum(f"Fact {turn} about user {user}" not in store.get(("memory", f"user-{user}"), "user_memory").value["memory"]
+                  for user in range(users) for turn in range(turns))
+    stats = memory_writer.writer.stats()
+    memory_writer.writer.shutdown()
+    return {"p50": statistics.median(latencies), "max": max(latencies), "replied": replied, "written": written,
+            "extractions": model.extractions, "missing": missing, "writer": stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per model call")
+    parser.add_argument("--debounce", type=float, default=0.5, help="Seconds the writer waits for more turns")
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} {'turn p50 (ms)':>14} {'turn max (ms)':>14} {'replied (s)':>12} {'written (s)':>12} "
+          f"{'extractions':>12} {'missing':>8}")
+    for mode in ["inline", "deferred"]:
+        result = run(mode, args.users, args.turns, args.latency, args.debounce)
+        print(f"{mode:<9} {result['p50'] * 1000:>14.0f} {result['max'] * 1000:>14.0f} {result['replied']:>12.2f} "
+              f"{result['written']:>12.2f} {result['extractions']:>12} {result['missing']:>8}")
+        if mode == "deferred":
+            print("writer: " + ", ".join(f"{name} {value:.2f}" if isinstance(value, float) else f"{name} {value}"
+                                         for name, value in result["writer"].items()))
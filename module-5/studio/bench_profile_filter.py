@@ -0,0 +1,124 @@
+""" Extractions and profile writes saved by the profile change detection
+
+Usage:
+    python bench_profile_filter.py --users 20 --turns 30
+
+Runs conversations through the chatbot_memory_profile graph
+(memoryschema_profile.py) where most turns are small talk and some state a
+name, a location or an interest, once with profile_extraction "always" and
+once with "on_signal". The extractor is a stub that builds the UserProfile
+from every user message with regular expressions, so the final profiles show
+whether skipping lost anything. Also reports how turn_has_profile_signal
+labels the two kinds of message, profile statements written in lowercase,
+bare answers to the assistant's profile questions and retractions, and lists
+the small talk messages it flags (the list includes small talk that starts
+like an introduction or a retraction: "I'm not sure", "I don't know").
+"""
+import argparse
+import os
+import random
+import re
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+
+import memoryschema_profile
+import profile_filter
+
+SMALL_TALK = [
+    "Hi there!", "How are you today?", "Thanks, that helps.", "What's the weather like?", "Can you tell me a joke?",
+    "Ok, sounds good.", "What time is it in Tokyo?", "Tell me more about that.", "Haha, nice one.", "Good morning!",
+    "Could you summarise what we discussed?", "That's interesting.", "Why is the sky blue?", "I'm tired today.",
+    "Let's talk about something else.", "See you later!", "Is it going to rain?", "Can you explain recursion?",
+    # Small talk that starts like an introduction or a retraction
+    "I'm not sure about that.", "i'm good, thanks", "I'm so tired today.", "im fine", "I'm sorry to hear that.",
+    "I'm going to bed now.", "This is great, thanks!", "This is so helpful.", "I am a bit confused.",
+    "I don't know.", "I don't think so.", "I do not understand.", "I never thought of it that way.",
+    "I stopped by the shop earlier.", "I'm back!", "I'm curious how that works.", "i'm kinda busy right now",
+    "I don't have time today.",
+]
+PROFILE_STATEMENTS = [
+    "My name is {name}.", "I live in {city} now.", "I love {interest}.", "I'm {name}, by the way.",
+    "I just moved to {city}.", "I really enjoy {interest} on weekends.", "I'm into {interest} these days.",
+]
+# Statements that take back a location or an interest
+RETRACTIONS = [
+    "I don't live in {city} anymore.", "I no longer play {interest}.", "I stopped hiking last year.", "i don't really like {interest}",
+]
+# An assistant question, and the bare answer to it
+PROFILE_ANSWERS = [
+    ("What's your name?", "{name}"), ("Where do you live?", "{city}"), ("What do you enjoy doing on weekends?", "{interest}"),
+]
+NAMES = ["Lance", "Priya", "Mateo", "Ines", "Kofi"]
+CITIES = ["San Francisco", "Lisbon", "Accra", "Denver"]
+INTERESTS = ["biking", "bakeries", "chess", "jazz", "hiking"]
+
+def stub_extractor():
+    """Builds the profile from the user messages, the way Trustcall would merge it into the existing one"""
+    def extract(input):
+        profile = dict((input["existing"] or {}).get("UserProfile") or {"user_name": "Unknown", "user_location": "Unknown", "interests": []})
+        for message in input["messages"]:
+            if message.type != "human":
+                continue
+            if match := re.search(r"(?:My name is|I'm) ([A-Z][a-z]+)", message.content):
+                profile["user_name"] = match.group(1)
+            if match := re.search(r"(?:live in|moved to) ([A-Z][A-Za-z ]+)", message.content):
+                profile["user_location"] = match.group(1).removesuffix(" now")
+            if match := re.search(r"(?:love|enjoy|into) (\w+)", message.content):
+                profile["interests"] = sorted(set(profile["interests"]) | {match.group(1)})
+        return {"messages": [], "responses": [memoryschema_profile.UserProfile(**profile)], "response_metadata": [{}]}
+    return RunnableLambda(extract)
+
+def conversation(rng: random.Random, turns: int, profile_share: float) -> list[str]:
+    return [rng.choice(PROFILE_STATEMENTS).format(name=rng.choice(NAMES), city=rng.choice(CITIES), interest=rng.choice(INTERESTS))
+            if rng.random() < profile_share else rng.choice(SMALL_TALK) for _ in range(turns)]
+
+def run(mode: str, conversations: list[list[str]]) -> tuple[dict, list]:
+    memoryschema_profile.model = FakeListChatModel(responses=["Nice to chat with you."])
+    memoryschema_profile.trustcall_extractor = stub_extractor()
+    profile_filter.counters.reset()
+    store = InMemoryStore()
+    graph = memoryschema_profile.builder.compile(checkpointer=MemorySaver(), store=store)
+    for user, messages in enumerate(conversations):
+        config = {"configurable": {"thread_id": str(user), "user_id": str(user), "profile_extraction": mode}}
+        for message in messages:
+            graph.invoke({"messages": [("user", message)]}, config)
+    profiles = [getattr(store.get(("memory", str(user)), "user_memory"), "value", None) for user in range(len(conversations))]
+    return profile_filter.counters.stats(), profiles
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--profile-share", type=float, default=0.15, help="Share of turns that state a profile fact")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    statements = [template.format(name=name, city=city, interest=interest) for template in PROFILE_STATEMENTS
+                  for name, city, interest in zip(NAMES, CITIES, INTERESTS)]
+    answers = [[AIMessage(content=question), HumanMessage(content=answer.format(name=name, city=city, interest=interest))]
+               for question, answer in PROFILE_ANSWERS for name, city, interest in zip(NAMES, CITIES, INTERESTS)]
+    detected = sum(profile_filter.turn_has_profile_signal([HumanMessage(content=message)]) for message in statements)
+    lowercase = sum(profile_filter.turn_has_profile_signal([HumanMessage(content=message.lower())]) for message in statements)
+    answered = sum(profile_filter.turn_has_profile_signal(messages) for messages in answers)
+    retractions = [template.format(city=city, interest=interest) for template in RETRACTIONS for city, interest in zip(CITIES, INTERESTS)]
+    retracted = sum(profile_filter.turn_has_profile_signal([HumanMessage(content=message)]) for message in retractions)
+    false_alarms = [message for message in SMALL_TALK if profile_filter.turn_has_profile_signal([HumanMessage(content=message)])]
+    print(f"signal found in {detected}/{len(statements)} profile statements ({lowercase} in lowercase), "
+          f"{answered}/{len(answers)} bare answers to a profile question, {retracted}/{len(retractions)} retractions "
+          f"and {len(false_alarms)}/{len(SMALL_TALK)} small talk messages {false_alarms}")
+
+    rng = random.Random(args.seed)
+    conversations = [conversation(rng, args.turns, args.profile_share) for _ in range(args.users)]
+    results = {mode: run(mode, conversations) for mode in ["always", "on_signal"]}
+    print(f"{'mode':<10} {'turns':>6} {'extractions':>12} {'skipped':>8} {'writes':>7} {'skipped writes':>15}")
+    for mode, (stats, _) in results.items():
+        print(f"{mode:<10} {args.users * args.turns:>6} {stats['extractions']:>12} {stats['skipped_extractions']:>8} "
+              f"{stats['writes']:>7} {stats['skipped_writes']:>15}")
+    same = sum(a == b for a, b in zip(results["always"][1], results["on_signal"][1]))
+    print(f"final profiles identical for {same}/{args.users} users")
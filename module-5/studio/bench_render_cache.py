@@ -0,0 +1,125 @@
+""" CPU time and allocation per turn with and without the rendered-prompt cache
+
+Usage:
+    python bench_render_cache.py --requests 20000 --users 100 --todos 20 --write-every 50
+
+Replays --requests turns, spread over --users users, through the node that
+builds the system prompt in each graph that shares render_cache.cache:
+call_model of memory_store.py and memoryschema_profile.py, and task_mAIstro of
+memory_agent.py (a profile, --todos ToDos and instructions per user). The
+model is a stub that replies at once, so the node's cost is the store reads
+and the prompt. Every --write-every turns a memory of the user is rewritten,
+which changes its updated_at and makes the next turn render again. Reports the
+CPU time and the peak memory allocated per turn, with the cache and with every
+prompt rendered (off).
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+import memory_agent
+import memory_store
+import memoryschema_profile
+import render_cache
+
+class InstantModel:
+    """Replies at once, so only the node's own work is measured."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def invoke(self, messages):
+        return AIMessage(content="Noted.")
+
+class NoCache:
+    """Renders every prompt, as the graphs did before the cache."""
+
+    def render(self, graph, items, build):
+        return build()
+
+def seed_memory_store(store: InMemoryStore, user_id: str, version: int, rng: random.Random):
+    facts = "\n".join(f"- The user mentioned fact {rng.randrange(10**6)} about their week" for _ in range(20))
+    store.put(("memory", user_id), "user_memory", {"memory": f"{facts}\n- Revision {version}"})
+
+def seed_memoryschema_profile(store: InMemoryStore, user_id: str, version: int, rng: random.Random):
+    interests = [f"interest {rng.randrange(10**6)}" for _ in range(10)] + [f"revision {version}"]
+    store.put(("memory", user_id), "user_memory", {"user_name": user_id, "user_location": "San Francisco", "interests": interests})
+
+def seed_memory_agent(store: InMemoryStore, user_id: str, version: int, rng: random.Random, todos: int):
+    store.put(("profile", user_id), "profile", {"name": user_id, "location": "San Francisco", "job": "Engineer",
+                                                "connections": ["Sam", "Alex"], "interests": ["biking", f"revision {version}"]})
+    if version == 0:
+        for i in range(todos):
+            store.put(("todo", user_id), f"todo-{i}", {"task": f"Task {i}: book appointment {rng.randrange(10**6)}",
+                                                       "time_to_complete": 30, "deadline": None,
+                                                       "solutions": ["Call ahead", "Book online"], "status": "not started"})
+        store.put(("instructions", user_id), "user_instructions", {"memory": "Add a deadline to every ToDo."})
+
+GRAPHS = {
+    "memory_store": (memory_store, memory_store.call_model, seed_memory_store),
+    "memoryschema_profile": (memoryschema_profile, memoryschema_profile.call_model, seed_memoryschema_profile),
+    "memory_agent": (memory_agent, memory_agent.task_mAIstro, seed_memory_agent),
+}
+
+def run(name: str, cached: bool, requests: int, users: int, todos: int, write_every: int, seed: int, repeat: int) -> dict:
+    module, node, seed_user = GRAPHS[name]
+    module.model = InstantModel()
+    render_cache.cache = render_cache.RenderCache() if cached else NoCache()
+    rng = random.Random(seed)
+    store = InMemoryStore()
+    extra = (todos,) if name == "memory_agent" else ()
+    versions = dict.fromkeys(range(users), 0)
+    for user in versions:
+        seed_user(store, f"user-{user}", 0, rng, *extra)
+    state = {"messages": [HumanMessage(content="What should I do today?")]}
+
+    peak = 0
+    tracemalloc.start()
+    for request in range(requests):
+        user = rng.randrange(users)
+        if write_every and request % write_every == write_every - 1:
+            versions[user] += 1
+            seed_user(store, f"user-{user}", versions[user], rng, *extra)
+        config = {"configurable": {"user_id": f"user-{user}"}}
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        node(state, config, store)
+        peak += tracemalloc.get_traced_memory()[1] - start_size
+    tracemalloc.stop()
+
+    # tracemalloc slows every allocation down, so CPU time is measured in more passes without it, keeping the fastest
+    configs = [{"configurable": {"user_id": f"user-{rng.randrange(users)}"}} for _ in range(requests)]
+    untraced = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for config in configs:
+            node(state, config, store)
+        untraced = min(untraced, time.process_time() - start)
+
+    stats = render_cache.cache.stats() if cached else None
+    return {"us": untraced / requests * 1e6, "peak_kb": peak / requests / 1024, "stats": stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos", type=int, default=20, help="ToDos per user in memory_agent")
+    parser.add_argument("--write-every", type=int, default=50, help="Turns between memory writes (0 for none)")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes timed without tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'graph':<21} {'cache':<5} {'CPU/turn (us)':>14} {'peak alloc/turn (KB)':>21} {'hit rate':>9}")
+    for name in GRAPHS:
+        for cached in [False, True]:
+            result = run(name, cached, args.requests, args.users, args.todos, args.write_every, args.seed, args.repeat)
+            stats = result["stats"]
+            hit_rate = f"{stats['hits'] / (stats['hits'] + stats['misses']):.1%}" if stats else "-"
+            print(f"{name:<21} {'on' if cached else 'off':<5} {result['us']:>14.1f} {result['peak_kb']:>21.1f} {hit_rate:>9}")
@@ -0,0 +1,199 @@
+""" Compaction of a user's Memory collection
+
+Trustcall inserts a new Memory whenever it decides to, so over time a
+collection fills up with near-duplicates, all of which end up in the system
+prompt and in the `existing` payload of every extraction. compact() clusters
+the memories of a namespace and keeps one canonical entry per cluster:
+
+- A memory joins the first cluster whose first member it is similar to: the
+  cosine similarity of their hashing embeddings (see retrieval.py, whose
+  embedding cache is reused) reaches the threshold. Otherwise it starts a
+  cluster.
+- Only memories that share one of their rarest features are compared, so
+  common words ("likes", "work") do not make the job quadratic.
+- The canonical entry of a cluster is its most informative member (the most
+  distinct content words, then the most recently updated), under its own key,
+  so Trustcall keeps patching the same document.
+- A member whose content words all appear in the canonical entry is a
+  rewording and is deleted. A member with details of its own is merged into
+  the canonical entry by `merge` (in the graph, a Trustcall extractor given
+  the canonical entry as `existing`) and then deleted; without `merge`, or if
+  the merge returns nothing, it is kept, so no detail is ever lost.
+- The deletes and merged entries are written in a single store batch.
+
+By default nothing is written (dry run): the report lists every memory that
+would be deleted and the canonical entry it is folded into. Set
+compaction_mode to "apply" to write.
+
+The job is the memory_compaction graph, to be run off-peak, for example as a
+cron: client.crons.create("memory_compaction", schedule="0 3 * * *", input={},
+config={"configurable": {"user_id": ..., "compaction_mode": "apply"}}).
+Memories written while it runs may be merged away, so schedule it when the
+user is idle.
+"""
+import json
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Optional, TypedDict
+
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables.config import RunnableConfig
+from langgraph.graph import StateGraph, START, END
+from langgraph.store.base import BaseStore, Item, PutOp
+
+import configuration
+import retrieval
+
+# Folds the details of near-duplicates into their canonical entry, as a patch of that one document.
+# Built on first use, so that a dry run or a compaction without merges needs no model.
+merge_extractor = None
+_merge_lock = threading.Lock()
+
+def get_merge_extractor():
+    """The Trustcall extractor over memoryschema_collection's Memory schema, created on first use"""
+    global merge_extractor
+    with _merge_lock:
+        if merge_extractor is None:
+            from trustcall import create_extractor
+            import memoryschema_collection
+            merge_extractor = create_extractor(
+                memoryschema_collection.model,
+                tools=[memoryschema_collection.Memory],
+                tool_choice="Memory",
+            )
+        return merge_extractor
+
+# Merge instruction
+MERGE_INSTRUCTION = """The memories below are near-duplicates of the existing memory about the user.
+
+Update the existing memory so that it keeps every detail they add, without repeating anything:
+
+{memories}"""
+
+# Merges the members of a cluster into its canonical entry, returning the canonical entry's new value (None if it could not)
+Merge = Callable[[Item, list[Item]], Optional[dict]]
+
+# Rarest features of a memory used to find the memories to compare it with
+BLOCKING_FEATURES = 3
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+def prompt_tokens(items: list[Item]) -> int:
+    """Tokens of the memories as call_model formats them"""
+    return estimate_tokens("\n".join(f"- {item.value.get('content', '')}" for item in items))
+
+def existing_tokens(items: list[Item]) -> int:
+    """Tokens of the memories as write_memory passes them to Trustcall"""
+    return estimate_tokens(json.dumps([(item.key, "Memory", item.value) for item in items]))
+
+def clusters(items: list[Item], threshold: float) -> list[list[Item]]:
+    """Groups of memories at least `threshold` similar to the group's first member, in store order"""
+    vectors = [retrieval.embeddings.get(tuple(item.namespace), item.key, str(item.value.get("content", ""))) for item in items]
+    frequency = Counter(bucket for vector in vectors for bucket in vector)
+    # Index of the first member of each memory's group
+    leader = list(range(len(items)))
+
+    postings = defaultdict(list)
+    for i, vector in enumerate(vectors):
+        rarest = sorted(vector, key=lambda bucket: (frequency[bucket], bucket))[:BLOCKING_FEATURES]
+        # Comparing with the leaders only keeps chains of similar memories from drifting into one group
+        leaders = sorted({leader[j] for bucket in rarest for j in postings[bucket]})
+        for j in leaders:
+            if retrieval.similarity(vector, vectors[j]) >= threshold:
+                leader[i] = j
+                break
+        for bucket in rarest:
+            postings[bucket].append(i)
+
+    groups = defaultdict(list)
+    for i, item in enumerate(items):
+        groups[leader[i]].append(item)
+    return list(groups.values())
+
+def content_words(item: Item) -> set[str]:
+    return set(retrieval.tokens(str(item.value.get("content", ""))))
+
+def canonical(group: list[Item]) -> Item:
+    return max(group, key=lambda item: (len(content_words(item)), item.updated_at))
+
+def merge_with_trustcall(keep: Item, members: list[Item]) -> Optional[dict]:
+    """The canonical entry patched by Trustcall with the details of the other members, None if Trustcall returned no memory"""
+    memories = "\n".join(f"- {item.value.get('content', '')}" for item in members)
+    result = get_merge_extractor().invoke({"messages": [SystemMessage(content=MERGE_INSTRUCTION.format(memories=memories))],
+                                           "existing": [(keep.key, "Memory", keep.value)]})
+    if not result["responses"]:
+        return None
+    return result["responses"][0].model_dump(mode="json")
+
+def compact(store: BaseStore, namespace: tuple[str, ...], threshold: float, dry_run: bool = True,
+            merge: Optional[Merge] = None) -> dict:
+    """Merge the near-duplicate memories in `namespace`, returning counts, token estimates and the deleted memories.
+
+    Members with details missing from their canonical entry are merged into it with `merge`; they are kept if
+    `merge` is None or returns None. In a dry run nothing is merged or written, and the report is what the run would do.
+    """
+    items = store.search(namespace, limit=retrieval.MAX_CANDIDATES)
+    ops, deleted, merged, kept_details = [], [], 0, 0
+    after = {item.key: item for item in items}
+    for group in clusters(items, threshold):
+        keep = canonical(group)
+        words = content_words(keep)
+        members = [item for item in group if item is not keep]
+        with_details = [item for item in members if content_words(item) - words]
+        merging = bool(with_details) and merge is not None
+        if merging and not dry_run:
+            value = merge(keep, members)
+            if value is None:
+                merging = False
+            else:
+                ops.append(PutOp(namespace, keep.key, value))
+                after[keep.key] = Item(value=value, key=keep.key, namespace=keep.namespace,
+                                       created_at=keep.created_at, updated_at=keep.updated_at)
+        if with_details and not merging:
+            # Only the rewordings can go without losing anything
+            kept_details += len(with_details)
+            members = [item for item in members if item not in with_details]
+        merged += bool(members)
+        for item in members:
+            ops.append(PutOp(namespace, item.key, None))
+            deleted.append({"key": item.key, "content": item.value.get("content", ""), "canonical_key": keep.key,
+                            "merged": merging})
+            del after[item.key]
+    if ops and not dry_run:
+        store.batch(ops)
+    kept = list(after.values())
+    return {
+        "dry_run": dry_run,
+        "memories_before": len(items),
+        "memories_after": len(kept),
+        "clusters_merged": merged,
+        "kept_with_details": kept_details,
+        "prompt_tokens_before": prompt_tokens(items),
+        "prompt_tokens_after": prompt_tokens(kept),
+        "existing_tokens_before": existing_tokens(items),
+        "existing_tokens_after": existing_tokens(kept),
+        "deleted": deleted,
+    }
+
+class CompactionState(TypedDict, total=False):
+    report: dict
+
+def compact_memories(state: CompactionState, config: RunnableConfig, store: BaseStore):
+
+    """Merge the near-duplicate memories of the configured user."""
+
+    # Get configuration
+    configurable = configuration.Configuration.from_runnable_config(config)
+
+    # The namespace memoryschema_collection writes to
+    namespace = ("memories", configurable.user_id)
+    dry_run = configurable.compaction_mode != "apply"
+    return {"report": compact(store, namespace, configurable.compaction_threshold, dry_run=dry_run, merge=merge_with_trustcall)}
+
+# Define the graph
+builder = StateGraph(CompactionState, config_schema=configuration.Configuration)
+builder.add_node("compact_memories", compact_memories)
+builder.add_edge(START, "compact_memories")
+builder.add_edge("compact_memories", END)
+graph = builder.compile()
@@ -10,6 +10,20 @@ from dataclasses import dataclass
 class Configuration:
     """The configurable fields for the chatbot."""
     user_id: str = "default-user"
+    # "semantic" puts the memories most similar to the latest user message in the system prompt, ranking the whole namespace
+    # in process; "store_index" lets the store's vector index rank them (see langgraph.json), which scales to large
+    # collections and falls back to "semantic" on a store without an index; "all" puts the first page of the namespace
+    memory_retrieval: str = "semantic"
+    # Memories put in the system prompt in semantic and store_index modes
+    memory_top_k: int = 5
+    # "deferred" returns the reply right away and leaves write_memory to the shared, debounced memory writer, "inline" writes before the run ends
+    memory_write_mode: str = "inline"
+    # "on_signal" skips the profile extraction when the latest user message mentions no name, location or interest, "always" runs it every turn
+    profile_extraction: str = "on_signal"
+    # Similarity from which memory_compaction merges two memories (facts that differ in one word score about 0.8)
+    compaction_threshold: float = 0.85
+    # "dry_run" only reports what memory_compaction would merge and delete, "apply" writes it
+    compaction_mode: str = "dry_run"
 
     @classmethod
     def from_runnable_config(
@@ -24,4 +38,7 @@ class Configuration:
             for f in fields(cls)
             if f.init
         }
-        return cls(**{k: v for k, v in values.items() if v})
\ No newline at end of file
+        # Values from the environment are strings, so parse the ones meant to be numbers
+        numbers = {f.name: f.type for f in fields(cls) if f.type in (int, float)}
+        return cls(**{k: numbers[k](v) if k in numbers and isinstance(v, str) else v
+                      for k, v in values.items() if v is not None})
\ No newline at end of file
@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime
+from functools import partial
 
 from pydantic import BaseModel, Field
 
@@ -15,10 +16,11 @@ from langchain_openai import ChatOpenAI
 
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langgraph.store.base import BaseStore
+from langgraph.store.base import BaseStore, Item
 from langgraph.store.memory import InMemoryStore
 
 import configuration
+import render_cache
 
 ## Utilities 
 
@@ -201,6 +203,24 @@ Your current instructions are:
 
 ## Node definitions
 
+def render_system_message(profile_memories: list[Item], todo_memories: list[Item], instruction_memories: list[Item]) -> str:
+
+    """Format the profile, the ToDo list and the instructions in the system prompt."""
+
+    if profile_memories:
+        user_profile = profile_memories[0].value
+    else:
+        user_profile = None
+
+    todo = "\n".join(f"{mem.value}" for mem in todo_memories)
+
+    if instruction_memories:
+        instructions = instruction_memories[0].value
+    else:
+        instructions = ""
+    
+    return MODEL_SYSTEM_MESSAGE.format(user_profile=user_profile, todo=todo, instructions=instructions)
+
 def task_mAIstro(state: MessagesState, config: RunnableConfig, store: BaseStore):
 
     """Load memories from the store and use them to personalize the chatbot's response."""
@@ -210,27 +230,17 @@ def task_mAIstro(state: MessagesState, config: RunnableConfig, store: BaseStore)
     user_id = configurable.user_id
 
    # Retrieve profile memory from the store
-    namespace = ("profile", user_id)
-    memories = store.search(namespace)
-    if memories:
-        user_profile = memories[0].value
-    else:
-        user_profile = None
+    profile_memories = store.search(("profile", user_id))
 
     # Retrieve people memory from the store
-    namespace = ("todo", user_id)
-    memories = store.search(namespace)
-    todo = "\n".join(f"{mem.value}" for mem in memories)
+    todo_memories = store.search(("todo", user_id))
 
     # Retrieve custom instructions
-    namespace = ("instructions", user_id)
-    memories = store.search(namespace)
-    if memories:
-        instructions = memories[0].value
-    else:
-        instructions = ""
-    
-    system_msg = MODEL_SYSTEM_MESSAGE.format(user_profile=user_profile, todo=todo, instructions=instructions)
+    instruction_memories = store.search(("instructions", user_id))
+
+    # Format the memories in the system prompt, or reuse the prompt rendered from the same versions of them
+    system_msg = render_cache.cache.render(__name__, profile_memories + todo_memories + instruction_memories,
+                                           partial(render_system_message, profile_memories, todo_memories, instruction_memories))
 
     # Respond using memory as well as the chat history
     response = model.bind_tools([UpdateMemory], parallel_tool_calls=False).invoke([SystemMessage(content=system_msg)]+state["messages"])
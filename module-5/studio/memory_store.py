@@ -1,9 +1,14 @@
+from functools import partial
+from typing import Optional
+
 from langchain_core.messages import SystemMessage
 from langchain_core.runnables.config import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langgraph.store.base import BaseStore
+from langgraph.store.base import BaseStore, Item
 import configuration
+import memory_writer
+import render_cache
 
 # Initialize the LLM
 model = ChatOpenAI(model="gpt-4o", temperature=0) 
@@ -35,6 +40,19 @@ Remember: Only include factual information directly stated by the user. Do not m
 
 Based on the chat history below, please update the user information:"""
 
+def render_system_message(existing_memory: Optional[Item]) -> str:
+
+    """Format the memory in the system prompt."""
+
+    # Extract the memory
+    if existing_memory:
+        # Value is a dictionary with a memory key
+        existing_memory_content = existing_memory.value.get('memory')
+    else:
+        existing_memory_content = "No existing memory found."
+
+    return MODEL_SYSTEM_MESSAGE.format(memory=existing_memory_content)
+
 def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
 
     """Load memory from the store and use it to personalize the chatbot's response."""
@@ -50,33 +68,19 @@ def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
     key = "user_memory"
     existing_memory = store.get(namespace, key)
 
-    # Extract the memory
-    if existing_memory:
-        # Value is a dictionary with a memory key
-        existing_memory_content = existing_memory.value.get('memory')
-    else:
-        existing_memory_content = "No existing memory found."
-
-    # Format the memory in the system prompt
-    system_msg = MODEL_SYSTEM_MESSAGE.format(memory=existing_memory_content)
+    # Format the memory in the system prompt, or reuse the prompt rendered from the same version of it
+    system_msg = render_cache.cache.render(__name__, [existing_memory], partial(render_system_message, existing_memory))
 
     # Respond using memory as well as the chat history
     response = model.invoke([SystemMessage(content=system_msg)]+state["messages"])
 
     return {"messages": response}
 
-def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_memory(store: BaseStore, namespace: tuple, messages: list):
 
-    """Reflect on the chat history and save a memory to the store."""
-    
-    # Get configuration
-    configurable = configuration.Configuration.from_runnable_config(config)
-
-    # Get the user ID from the config
-    user_id = configurable.user_id
+    """Reflect on the messages and save a memory to the store."""
 
     # Retrieve existing memory from the store
-    namespace = ("memory", user_id)
     existing_memory = store.get(namespace, "user_memory")
 
     # Extract the memory
@@ -88,12 +92,29 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
         
     # Format the memory in the system prompt
     system_msg = CREATE_MEMORY_INSTRUCTION.format(memory=existing_memory_content)
-    new_memory = model.invoke([SystemMessage(content=system_msg)]+state['messages'])
+    new_memory = model.invoke([SystemMessage(content=system_msg)]+messages)
 
     # Overwrite the existing memory in the store 
     key = "user_memory"
     store.put(namespace, key, {"memory": new_memory.content})
 
+def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+
+    """Reflect on the chat history and save a memory to the store."""
+    
+    # Get configuration
+    configurable = configuration.Configuration.from_runnable_config(config)
+
+    # Get the user ID from the config
+    user_id = configurable.user_id
+
+    # Update the memory now, or leave it to the memory writer and return right away
+    namespace = ("memory", user_id)
+    if configurable.memory_write_mode == "deferred":
+        memory_writer.writer.submit((__name__,) + namespace, state["messages"], partial(update_memory, store, namespace))
+    else:
+        update_memory(store, namespace, state["messages"])
+
 # Define the graph
 builder = StateGraph(MessagesState,config_schema=configuration.Configuration)
 builder.add_node("call_model", call_model)
@@ -0,0 +1,228 @@
+""" Deferred, debounced memory writing for the module-5 graphs
+
+Run inline, write_memory makes every turn wait for a second model call before
+the run completes. In deferred mode, write_memory hands the extraction to the
+shared MemoryWriter and returns right away:
+
+- Jobs are keyed by graph and namespace. A job waits `debounce` seconds
+  after its latest submission (at most `max_delay` after its first), and
+  submissions for a key that is still waiting are coalesced into it, so a
+  burst of turns triggers one extraction over their combined messages.
+- At most `max_workers` jobs run at once, and never two for the same key, so
+  a profile is not overwritten by an extraction over older messages.
+- Backpressure: when `max_backlog` keys are waiting or running, a new key's
+  job runs inline in the caller instead of being queued.
+- At exit, after concurrent.futures has let the running jobs finish and
+  stopped the worker pool, an atexit hook runs the jobs still waiting in the
+  main thread, for at most EXIT_TIMEOUT_SECONDS. Long-lived callers can call
+  writer.flush() themselves, e.g. before a deployment stops a worker.
+
+stats() reports the queue and what it saved: submissions, coalesced
+submissions, jobs run, inline runs, failures, the current and largest backlog,
+and how long jobs waited.
+"""
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+from langchain_core.messages import AnyMessage
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the shared writer
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 10.0
+MAX_WORKERS = 4
+MAX_BACKLOG = 1000
+
+# Longest the process waits at exit for the memory writes still to be made
+EXIT_TIMEOUT_SECONDS = 30.0
+
+Job = Callable[[list[AnyMessage]], None]
+
+def merge_messages(earlier: list[AnyMessage], later: list[AnyMessage]) -> list[AnyMessage]:
+    """`earlier` followed by the messages of `later` it does not already contain (by id)"""
+    seen = {message.id for message in earlier if message.id}
+    return earlier + [message for message in later if not message.id or message.id not in seen]
+
+@dataclass
+class _Pending:
+    job: Job
+    messages: list[AnyMessage]
+    first: float
+    due: float
+
+@dataclass
+class _Stats:
+    submitted: int = 0
+    coalesced: int = 0
+    completed: int = 0
+    failed: int = 0
+    inline: int = 0
+    max_backlog: int = 0
+    wait_seconds: float = 0.0
+
+class MemoryWriter:
+    """Debounces, coalesces and runs memory extraction jobs on a bounded pool of worker threads."""
+
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_DELAY_SECONDS,
+                 max_workers: int = MAX_WORKERS, max_backlog: int = MAX_BACKLOG):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_backlog = max_backlog
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="memory-writer")
+        self._pending: dict[Hashable, _Pending] = {}
+        self._running: set[Hashable] = set()
+        self._flushing = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = _Stats()
+        self._scheduler: Optional[threading.Thread] = None
+
+    def submit(self, key: Hashable, messages: list[AnyMessage], job: Job):
+        """Run `job` over `messages`, together with any messages submitted for `key` in the meantime"""
+        now = time.monotonic()
+        with self._condition:
+            self._stats.submitted += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.job = job
+                pending.messages = merge_messages(pending.messages, messages)
+                pending.due = min(now + self.debounce, pending.first + self.max_delay)
+                self._stats.coalesced += 1
+                self._condition.notify_all()
+                return
+            backlog = len(self._pending) + len(self._running)
+            run_inline = self._closed or backlog >= self.max_backlog
+            if run_inline:
+                self._stats.inline += 1
+            else:
+                self._pending[key] = _Pending(job, messages, first=now, due=now + self.debounce)
+                self._stats.max_backlog = max(self._stats.max_backlog, backlog + 1)
+                self._start_scheduler()
+                self._condition.notify_all()
+        if run_inline:
+            job(messages)
+
+    def _start_scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._schedule, name="memory-writer-scheduler", daemon=True)
+            self._scheduler.start()
+
+    def _schedule(self):
+        with self._condition:
+            # After shutdown, waiting jobs are run by shutdown() itself
+            while not self._closed:
+                now = time.monotonic()
+                for key in [key for key in self._pending if key not in self._running]:
+                    pending = self._pending[key]
+                    if pending.due <= now or self._flushing:
+                        try:
+                            self._executor.submit(self._run, key, pending)
+                        except RuntimeError:
+                            # The pool is shutting down with the interpreter: leave the job waiting for shutdown() to run
+                            self._closed = True
+                            break
+                        del self._pending[key]
+                        self._running.add(key)
+                        self._stats.wait_seconds += now - pending.first
+                if self._closed:
+                    self._condition.notify_all()
+                    break
+                # Sleep until the next job is due, or something changes
+                due = [self._pending[key].due for key in self._pending if key not in self._running]
+                self._condition.wait(max(min(due) - now, 0.001) if due else None)
+
+    def _run(self, key: Hashable, pending: _Pending):
+        try:
+            pending.job(pending.messages)
+        except Exception:
+            logger.exception("Deferred memory write for %s failed", key)
+            failed = True
+        else:
+            failed = False
+        with self._condition:
+            self._running.discard(key)
+            if failed:
+                self._stats.failed += 1
+            else:
+                self._stats.completed += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Run every waiting job now and wait for all jobs to finish; False if `timeout` passed first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                done = self._condition.wait_for(lambda: self._closed or (not self._pending and not self._running), timeout)
+            finally:
+                self._flushing -= 1
+            closed = self._closed
+        if closed:
+            # The scheduler has stopped, so the waiting jobs run here
+            return self.shutdown(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+        return done
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Run the waiting jobs in this thread and wait for the running ones; later submissions run inline
+
+        Runs at exit, when the worker pool no longer accepts jobs. Returns False
+        if jobs were still waiting or running after `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        while True:
+            with self._condition:
+                if not self._pending:
+                    break
+                key, pending = next(iter(self._pending.items()))
+                # Never alongside a running job for the same key
+                if not self._condition.wait_for(lambda: key not in self._running, remaining()):
+                    break
+                del self._pending[key]
+                self._running.add(key)
+                self._stats.wait_seconds += time.monotonic() - pending.first
+            self._run(key, pending)
+        with self._condition:
+            finished = self._condition.wait_for(lambda: not self._pending and not self._running, remaining())
+            if not finished:
+                logger.warning("Memory writer shut down with %d waiting and %d running writes",
+                               len(self._pending), len(self._running))
+        self._executor.shutdown(wait=finished)
+        return finished
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = self._stats
+            started = stats.completed + stats.failed + len(self._running)
+            return {
+                "submitted": stats.submitted,
+                "coalesced": stats.coalesced,
+                "completed": stats.completed,
+                "failed": stats.failed,
+                "inline": stats.inline,
+                "pending": len(self._pending),
+                "running": len(self._running),
+                "max_backlog": stats.max_backlog,
+                "mean_wait_seconds": stats.wait_seconds / started if started else 0.0,
+            }
+
+# The memory_store, memoryschema_profile and memoryschema_collection graphs all queue their writes here
+writer = MemoryWriter()
+
+def _shutdown_at_exit():
+    writer.shutdown(timeout=EXIT_TIMEOUT_SECONDS)
+
+atexit.register(_shutdown_at_exit)
@@ -1,4 +1,5 @@
 import uuid 
+from functools import partial
 
 from pydantic import BaseModel, Field
 
@@ -11,6 +12,8 @@ from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.store.base import BaseStore
 import configuration
+import memory_writer
+import retrieval
 
 # Initialize the LLM
 model = ChatOpenAI(model="gpt-4o", temperature=0) 
@@ -55,7 +58,13 @@ def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
 
     # Retrieve memory from the store
     namespace = ("memories", user_id)
-    memories = store.search(namespace)
+    if configurable.memory_retrieval in ("semantic", "store_index"):
+        # Only the memories most relevant to the latest user message
+        query = retrieval.latest_user_message(state["messages"])
+        memories = retrieval.search(store, namespace, query, configurable.memory_top_k,
+                                    use_index=configurable.memory_retrieval == "store_index")
+    else:
+        memories = store.search(namespace)
 
     # Format the memories for the system prompt
     info = "\n".join(f"- {mem.value['content']}" for mem in memories)
@@ -66,18 +75,9 @@ def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
 
     return {"messages": response}
 
-def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_memory(store: BaseStore, namespace: tuple, messages: list):
 
-    """Reflect on the chat history and save a memory to the store."""
-    
-    # Get configuration
-    configurable = configuration.Configuration.from_runnable_config(config)
-
-    # Get the user ID from the config
-    user_id = configurable.user_id
-
-    # Define the namespace for the memories
-    namespace = ("memories", user_id)
+    """Reflect on the messages and save memories to the store."""
 
     # Retrieve the most recent memories for context
     existing_items = store.search(namespace)
@@ -91,7 +91,7 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
                         )
 
     # Merge the chat history and the instruction
-    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION)] + state["messages"]))
+    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION)] + messages))
 
     # Invoke the extractor
     result = trustcall_extractor.invoke({"messages": updated_messages, 
@@ -104,6 +104,23 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
                   r.model_dump(mode="json"),
             )
 
+def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+
+    """Reflect on the chat history and save a memory to the store."""
+    
+    # Get configuration
+    configurable = configuration.Configuration.from_runnable_config(config)
+
+    # Get the user ID from the config
+    user_id = configurable.user_id
+
+    # Update the memories now, or leave it to the memory writer and return right away
+    namespace = ("memories", user_id)
+    if configurable.memory_write_mode == "deferred":
+        memory_writer.writer.submit((__name__,) + namespace, state["messages"], partial(update_memory, store, namespace))
+    else:
+        update_memory(store, namespace, state["messages"])
+
 # Define the graph
 builder = StateGraph(MessagesState,config_schema=configuration.Configuration)
 builder.add_node("call_model", call_model)
@@ -1,3 +1,6 @@
+from functools import partial
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 from trustcall import create_extractor
@@ -6,8 +9,11 @@ from langchain_core.messages import SystemMessage
 from langchain_core.runnables.config import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langgraph.store.base import BaseStore
+from langgraph.store.base import BaseStore, Item
 import configuration
+import memory_writer
+import profile_filter
+import render_cache
 
 # Initialize the LLM
 model = ChatOpenAI(model="gpt-4o", temperature=0) 
@@ -34,19 +40,9 @@ Here is the memory (it may be empty): {memory}"""
 # Extraction instruction
 TRUSTCALL_INSTRUCTION = """Create or update the memory (JSON doc) to incorporate information from the following conversation:"""
 
-def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
-
-    """Load memory from the store and use it to personalize the chatbot's response."""
-    
-    # Get configuration
-    configurable = configuration.Configuration.from_runnable_config(config)
+def render_system_message(existing_memory: Optional[Item]) -> str:
 
-    # Get the user ID from the config
-    user_id = configurable.user_id
-
-    # Retrieve memory from the store
-    namespace = ("memory", user_id)
-    existing_memory = store.get(namespace, "user_memory")
+    """Format the profile in the system prompt."""
 
     # Format the memories for the system prompt
     if existing_memory and existing_memory.value:
@@ -59,17 +55,11 @@ def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
     else:
         formatted_memory = None
 
-    # Format the memory in the system prompt
-    system_msg = MODEL_SYSTEM_MESSAGE.format(memory=formatted_memory)
+    return MODEL_SYSTEM_MESSAGE.format(memory=formatted_memory)
 
-    # Respond using memory as well as the chat history
-    response = model.invoke([SystemMessage(content=system_msg)]+state["messages"])
-
-    return {"messages": response}
-
-def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
 
-    """Reflect on the chat history and save a memory to the store."""
+    """Load memory from the store and use it to personalize the chatbot's response."""
     
     # Get configuration
     configurable = configuration.Configuration.from_runnable_config(config)
@@ -77,22 +67,64 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
     # Get the user ID from the config
     user_id = configurable.user_id
 
-    # Retrieve existing memory from the store
+    # Retrieve memory from the store
     namespace = ("memory", user_id)
     existing_memory = store.get(namespace, "user_memory")
+
+    # Format the memory in the system prompt, or reuse the prompt rendered from the same version of it
+    system_msg = render_cache.cache.render(__name__, [existing_memory], partial(render_system_message, existing_memory))
+
+    # Respond using memory as well as the chat history
+    response = model.invoke([SystemMessage(content=system_msg)]+state["messages"])
+
+    return {"messages": response}
+
+def update_memory(store: BaseStore, namespace: tuple, messages: list):
+
+    """Reflect on the messages and save the profile to the store."""
+
+    # Retrieve existing memory from the store
+    existing_memory = store.get(namespace, "user_memory")
         
     # Get the profile as the value from the list, and convert it to a JSON doc
     existing_profile = {"UserProfile": existing_memory.value} if existing_memory else None
     
     # Invoke the extractor
-    result = trustcall_extractor.invoke({"messages": [SystemMessage(content=TRUSTCALL_INSTRUCTION)]+state["messages"], "existing": existing_profile})
+    result = trustcall_extractor.invoke({"messages": [SystemMessage(content=TRUSTCALL_INSTRUCTION)]+messages, "existing": existing_profile})
+    profile_filter.counters.record("extractions")
     
     # Get the updated profile as a JSON object
     updated_profile = result["responses"][0].model_dump()
 
-    # Save the updated profile
+    # Save the updated profile, unless nothing changed
+    if profile_filter.same_profile(updated_profile, existing_memory.value if existing_memory else None):
+        profile_filter.counters.record("skipped_writes")
+        return
     key = "user_memory"
     store.put(namespace, key, updated_profile)
+    profile_filter.counters.record("writes")
+
+def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+
+    """Reflect on the chat history and save a memory to the store."""
+    
+    # Get configuration
+    configurable = configuration.Configuration.from_runnable_config(config)
+
+    # Get the user ID from the config
+    user_id = configurable.user_id
+
+    # Skip the extraction when the latest user message (or the question it answers) cannot change the profile
+    if configurable.profile_extraction == "on_signal" and not profile_filter.turn_has_profile_signal(state["messages"]):
+        profile_filter.counters.record("skipped_extractions")
+        return
+
+    # Update the profile now, or leave it to the memory writer and return right away
+    namespace = ("memory", user_id)
+    if configurable.memory_write_mode == "deferred":
+        memory_writer.writer.submit((__name__,) + namespace, state["messages"], partial(update_memory, store, namespace))
+    else:
+        update_memory(store, namespace, state["messages"])
 
 # Define the graph
 builder = StateGraph(MessagesState,config_schema=configuration.Configuration)
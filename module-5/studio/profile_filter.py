@@ -0,0 +1,120 @@
+""" Change detection for the UserProfile memory of memoryschema_profile
+
+Most turns are small talk that cannot change the profile, yet write_memory
+runs the Trustcall extractor and rewrites the profile after every one of
+them. Two checks skip that work:
+
+- Before extraction, turn_has_profile_signal() looks for phrases that
+  introduce a name, a location or an interest ("my name is", "I live in",
+  "I love") in the latest user message, or for a question about them ("what's
+  your name?") in the assistant message it answers, since a bare answer
+  ("Lance") has no such phrase. Without either, the extractor is not called.
+  "I'm ..." only counts when the next word can be a name, and "I don't ..."
+  only with a verb of living, working or an interest, so that "I'm tired" or
+  "I don't know" do not cost an extraction.
+- After extraction, the profile is only put when its JSON differs from the
+  stored one.
+
+`counters` records how often each check saved a call.
+"""
+import json
+import re
+import threading
+from typing import Optional
+
+from langchain_core.messages import AnyMessage
+
+# Things people do for fun, as the verbs that state or retract an interest
+INTEREST_VERBS = "like|love|enjoy|prefer|hate|dislike|play|ride|bike|run|cook|bake|paint|hike|swim|read|watch|collect"
+
+# Phrases that can introduce or retract a name, a location or an interest (UserProfile's fields)
+SIGNAL_PATTERNS = [
+    re.compile(r"\b(my name|call me|name's|i go by)\b", re.IGNORECASE),
+    re.compile(r"\b(i live|i'm from|i am from|based in|moved to|moving to|my (home|hometown|city|town|country))\b", re.IGNORECASE),
+    re.compile(rf"\bi (really |also |just )?({INTEREST_VERBS}|started|quit)\b", re.IGNORECASE),
+    re.compile(r"\b(i'm into|i am into|interested in|fan of|my (hobby|hobbies|favorite|favourite|passion))\b", re.IGNORECASE),
+    # Retractions of a place or an interest ("I don't live there anymore", "I stopped running"), but not "I don't know"
+    re.compile(rf"\bi (no longer|don't|do not|never) (really |actually )?({INTEREST_VERBS}|live|work)\b", re.IGNORECASE),
+    re.compile(r"\bi (stopped|quit|gave up) [a-z]+ing\b", re.IGNORECASE),
+]
+
+# "I'm Lance" or "this is Priya": an introduction followed by the word that may be a name
+INTRODUCTION = re.compile(r"\b(i am|i'm|im|this is) ([a-z]+)\b", re.IGNORECASE)
+
+# Words that follow "I'm" in small talk; a lowercase word outside them may be a name ("i'm lance")
+NOT_NAMES = frozenset("""
+    a an the so very really just not still also only too quite pretty kind kinda sort sorta super like all about
+    in on at off out up down over with into from back home here there now always never almost actually totally
+    honestly literally probably definitely finally sure fine good great well ok okay alright cool bad busy free
+    sorry glad happy sad sick hungry thirsty cold hot late early ready done new lost stuck awake asleep afraid
+    curious right wrong gonna tired bored excited stressed confused worried scared pleased annoyed exhausted
+    surprised amazed impressed relieved
+""".split())
+
+def names_someone(text: str) -> bool:
+    """Whether `text` introduces someone by a name: capitalised ("I'm Lance"), or lowercase but not a word of small talk"""
+    for match in INTRODUCTION.finditer(text):
+        word = match.group(2)
+        if word[0].isupper() and word[1:].islower():
+            return True
+        if word.islower() and word not in NOT_NAMES and not (len(word) >= 5 and word.endswith("ing")):
+            return True
+    return False
+
+# Questions of the assistant whose answer can be a bare name, place or interest
+QUESTION_PATTERNS = [
+    re.compile(r"\b(your name|call you|who are you)\b", re.IGNORECASE),
+    re.compile(r"\b(where (do|are) you|you (live|from|based)|your (home|hometown|city|town|country|location))\b", re.IGNORECASE),
+    re.compile(r"\b(do you (like|love|enjoy|do for fun)|you into|your (hobby|hobbies|interests?|favorite|favourite|passion))\b",
+               re.IGNORECASE),
+]
+
+def has_profile_signal(text: str) -> bool:
+    return names_someone(text) or any(pattern.search(text) for pattern in SIGNAL_PATTERNS)
+
+def asks_profile_question(text: str) -> bool:
+    return "?" in text and any(pattern.search(text) for pattern in QUESTION_PATTERNS)
+
+def turn_has_profile_signal(messages: list[AnyMessage]) -> bool:
+    """Whether the latest user message, or the assistant message it answers, can change the profile"""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            if has_profile_signal(str(messages[i].content)):
+                return True
+            previous = next((message for message in reversed(messages[:i]) if message.type == "ai"), None)
+            return previous is not None and asks_profile_question(str(previous.content))
+    return False
+
+def same_profile(profile: dict, stored: Optional[dict]) -> bool:
+    """Whether `profile` serialises to the same JSON as the stored profile"""
+    return stored is not None and json.dumps(profile, sort_keys=True) == json.dumps(stored, sort_keys=True)
+
+class ProfileWriteCounters:
+    """Extractions and profile writes made and skipped."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.extractions = 0
+            self.skipped_extractions = 0
+            self.writes = 0
+            self.skipped_writes = 0
+
+    def record(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "extractions": self.extractions,
+                "skipped_extractions": self.skipped_extractions,
+                "writes": self.writes,
+                "skipped_writes": self.skipped_writes,
+            }
+
+# Process-wide totals; memoryschema_profile records into them and the benchmark reads them
+counters = ProfileWriteCounters()
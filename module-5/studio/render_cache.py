@@ -0,0 +1,55 @@
+""" Cache of system prompts rendered from stored memories
+
+call_model (task_mAIstro in memory_agent) formats the stored memories into
+its system prompt on every turn, although they change far less often than
+they are read. RenderCache keeps each rendered prompt keyed by the graph and
+by the identity and version of every item it was rendered from: (namespace,
+key, updated_at). A turn that reads the same versions of the same items gets
+the same string back without formatting anything. A put changes updated_at,
+so the next turn renders again and nothing needs invalidating.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from langgraph.store.base import Item
+
+class RenderCache:
+    """Rendered prompts by (graph, versions of the items rendered); least recently used go first."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._prompts: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, graph: str, items: Iterable[Optional[Item]], build: Callable[[], str]) -> str:
+        """The prompt `build()` returns for these versions of `items` (None for a missing item)"""
+        key = (graph, *[None if item is None else (item.namespace, item.key, item.updated_at) for item in items])
+        with self._lock:
+            prompt = self._prompts.get(key)
+            if prompt is not None:
+                self._prompts.move_to_end(key)
+                self.hits += 1
+                return prompt
+            self.misses += 1
+        prompt = build()
+        with self._lock:
+            self._prompts[key] = prompt
+            while len(self._prompts) > self.maxsize:
+                self._prompts.popitem(last=False)
+        return prompt
+
+    def clear(self):
+        with self._lock:
+            self._prompts.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._prompts)}
+
+# One cache for memory_store, memoryschema_profile and memory_agent; the graph name is part of each key
+cache = RenderCache()
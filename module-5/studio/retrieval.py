@@ -0,0 +1,142 @@
+""" Semantic retrieval of stored memories for the system prompt
+
+Formatting the memories in a namespace into the system prompt either grows
+the prompt with the collection or, with a page limit, picks memories
+regardless of what the user is talking about. In semantic mode, call_model
+ranks the memories by the cosine similarity of their content to the latest
+user message and formats only the top k.
+
+Embeddings come from a hashing embedder: the words of a text (lowercased,
+without stopwords and a plural "s") and its adjacent word pairs are hashed
+into signed buckets, and the vector is L2-normalised. It is deterministic and
+needs no model or network, so retrieval runs offline.
+
+- "semantic" mode (the default) ranks the memories here, with sparse vectors
+  (bucket -> weight) cached per (namespace, key) together with the content
+  they were computed from and only recomputed when it changes. It works with
+  any store, but reads the whole namespace (up to MAX_CANDIDATES) every turn.
+- "store_index" mode leaves it to the store index, which langgraph.json
+  configures with `embed_texts`: the store embeds each item when it is put,
+  so only new or changed memories are embedded, ranks them itself and returns
+  only k. This is the mode for large collections. A store without an index
+  ignores the query and returns no scores; `search` then falls back to
+  ranking here.
+
+The index in langgraph.json is the store's, so it applies to every graph of
+this studio. Only items with a `content` field are embedded, which among
+these graphs are the Trustcall memories of memoryschema_collection.
+"""
+import hashlib
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+from langchain_core.messages import AnyMessage
+from langgraph.store.base import BaseStore, Item
+
+# Hash buckets of the sparse vectors; they only bound collisions
+DIMS = 1 << 20
+
+# Dimensions of the dense vectors given to the store index (must match "dims" in langgraph.json)
+INDEX_DIMS = 256
+
+# Memories ranked per query in semantic mode
+MAX_CANDIDATES = 100_000
+
+# Words that say nothing about what a memory is about ("user" starts most Trustcall memories)
+STOPWORDS = frozenset("""
+    a an and are as at be but by can did do does for from had has have he her him his how i i'm in is it its
+    me my of on or our she so that the their them they this to user user's was we were what when where which
+    who why will with you your about also been into just like than then there these very would
+""".split())
+
+Vector = dict[int, float]
+
+def tokens(text: str) -> list[str]:
+    words = (word.removesuffix("'s") for word in re.findall(r"[a-z0-9']+", text.lower()))
+    return [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in words if word not in STOPWORDS and len(word) > 1]
+
+def embed(text: str, dims: int = DIMS) -> Vector:
+    """Sparse, L2-normalised hashing embedding of `text` (empty if it has no content words)"""
+    words = tokens(text)
+    vector: Vector = {}
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        vector[h % dims] = vector.get(h % dims, 0.0) + (1.0 if h >> 63 else -1.0)
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items() if weight} if norm else {}
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Dense hashing embeddings, for the store index"""
+    dense = []
+    for text in texts:
+        vector = [0.0] * INDEX_DIMS
+        for bucket, weight in embed(text, INDEX_DIMS).items():
+            vector[bucket] = weight
+        dense.append(vector)
+    return dense
+
+def similarity(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+class EmbeddingCache:
+    """Embeddings by (namespace, key), kept with the content they were computed from; least recently used go first."""
+
+    def __init__(self, maxsize: int = 200_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[str, Vector]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: tuple[str, ...], key: str, content: str) -> Vector:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] == content:
+                self._entries.move_to_end((namespace, key))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        vector = embed(content)
+        with self._lock:
+            self._entries[(namespace, key)] = (content, vector)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+# One cache for the process, so embeddings survive from one run to the next
+embeddings = EmbeddingCache()
+
+def latest_user_message(messages: list[AnyMessage]) -> str:
+    for message in reversed(messages):
+        if message.type == "human":
+            return str(message.content)
+    return ""
+
+def top_k(items: Iterable[Item], query: str, k: int, field: str = "content", cache: EmbeddingCache = embeddings) -> list[Item]:
+    """The k items whose `field` is most similar to `query`, most similar first (ties keep the given order)"""
+    query_vector = embed(query)
+    return heapq.nlargest(k, items, key=lambda item: similarity(
+        query_vector, cache.get(tuple(item.namespace), item.key, str(item.value.get(field, "")))))
+
+def search(store: BaseStore, namespace: tuple[str, ...], query: str, k: int, use_index: bool = False) -> list[Item]:
+    """The k memories in `namespace` most relevant to `query`, ranked by the store index if `use_index`, here otherwise"""
+    if use_index:
+        results = store.search(namespace, query=query, limit=k)
+        # Without an index the store returns unscored items in namespace order
+        if all(item.score is not None for item in results):
+            return results
+    return top_k(store.search(namespace, limit=MAX_CANDIDATES), query, k)
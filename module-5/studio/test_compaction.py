@@ -0,0 +1,67 @@
+from langgraph.store.memory import InMemoryStore
+
+import compaction
+
+NAMESPACE = ("memories", "u")
+
+def store_with(contents):
+    store = InMemoryStore()
+    for key, content in contents.items():
+        store.put(NAMESPACE, key, {"content": content})
+    return store
+
+def keys(store):
+    return sorted(item.key for item in store.search(NAMESPACE, limit=100))
+
+DUPLICATES = {
+    "a": "User likes hiking in the Alps with their sister",
+    "b": "The user likes hiking in the Alps with their sister.",
+    "c": "User works as a nurse at the city hospital",
+}
+
+def test_dry_run_reports_without_writing():
+    store = store_with(DUPLICATES)
+    report = compaction.compact(store, NAMESPACE, 0.85)
+    assert report["dry_run"] and report["memories_before"] == 3 and report["memories_after"] == 2
+    # Rewordings tie on content, so the most recently updated one is kept
+    assert [(d["key"], d["canonical_key"]) for d in report["deleted"]] == [("a", "b")]
+    assert keys(store) == ["a", "b", "c"]
+
+def test_apply_deletes_rewordings():
+    store = store_with(DUPLICATES)
+    report = compaction.compact(store, NAMESPACE, 0.85, dry_run=False)
+    assert report["clusters_merged"] == 1
+    assert keys(store) == ["b", "c"]
+
+# "a" and "b" each add a detail; the others make those details common words, so that the two are compared
+DETAILS = {
+    "a": "User's sister Maya lives in Lisbon with two cats",
+    "b": "User's sister Maya lives in Lisbon and works as a nurse",
+    "c": "User's friend Tom works as a nurse",
+    "d": "User has two cats",
+}
+
+def test_members_with_details_are_kept_without_merge():
+    store = store_with(DETAILS)
+    report = compaction.compact(store, NAMESPACE, 0.6, dry_run=False)
+    assert report["kept_with_details"] == 1 and report["deleted"] == []
+    assert keys(store) == ["a", "b", "c", "d"]
+
+def test_members_with_details_are_merged_into_the_canonical_entry():
+    store = store_with(DETAILS)
+    merged = "User's sister Maya lives in Lisbon with two cats and works as a nurse"
+    report = compaction.compact(store, NAMESPACE, 0.6, dry_run=False, merge=lambda keep, members: {"content": merged})
+    assert report["clusters_merged"] == 1 and report["deleted"][0]["merged"]
+    assert keys(store) == ["b", "c", "d"]
+    assert store.get(NAMESPACE, "b").value["content"] == merged
+
+def test_an_empty_trustcall_response_keeps_the_members(monkeypatch):
+    class NoResponses:
+        def invoke(self, payload):
+            return {"responses": [], "messages": []}
+
+    monkeypatch.setattr(compaction, "merge_extractor", NoResponses())
+    store = store_with(DETAILS)
+    report = compaction.compact(store, NAMESPACE, 0.6, dry_run=False, merge=compaction.merge_with_trustcall)
+    assert report["kept_with_details"] == 1 and report["clusters_merged"] == 0
+    assert keys(store) == ["a", "b", "c", "d"]
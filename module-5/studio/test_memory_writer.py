@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.messages import HumanMessage
+
+import memory_writer
+
+def recorder():
+    calls = []
+    return calls, lambda messages: calls.append(([m.id for m in messages], threading.current_thread().name))
+
+def test_submissions_for_a_key_are_coalesced():
+    writer = memory_writer.MemoryWriter(debounce=60)
+    calls, job = recorder()
+    writer.submit("k", [HumanMessage("a", id="1")], job)
+    writer.submit("k", [HumanMessage("a", id="1"), HumanMessage("b", id="2")], job)
+    assert writer.flush(timeout=5)
+    assert [ids for ids, _ in calls] == [["1", "2"]]
+    assert writer.stats()["coalesced"] == 1
+    writer.shutdown()
+
+def test_shutdown_runs_waiting_jobs_in_the_caller_and_later_ones_inline():
+    writer = memory_writer.MemoryWriter(debounce=60)
+    calls, job = recorder()
+    writer.submit("k", [HumanMessage("a", id="1")], job)
+    assert writer.shutdown(timeout=5)
+    writer.submit("other", [HumanMessage("b", id="2")], job)
+    current = threading.current_thread().name
+    assert calls == [(["1"], current), (["2"], current)]
+
+def test_shutdown_gives_up_after_the_timeout():
+    writer = memory_writer.MemoryWriter(debounce=0)
+    started = threading.Event()
+    writer.submit("k", [], lambda messages: (started.set(), time.sleep(2)))
+    assert started.wait(5)
+    begin = time.monotonic()
+    assert not writer.shutdown(timeout=0.2)
+    assert time.monotonic() - begin < 1
+
+def test_a_job_refused_by_the_pool_is_run_by_flush():
+    writer = memory_writer.MemoryWriter(debounce=0)
+    writer._executor.shutdown()
+    calls, job = recorder()
+    writer.submit("k", [HumanMessage("a", id="1")], job)
+    assert writer.flush(timeout=5)
+    assert [ids for ids, _ in calls] == [["1"]]
+
+def test_waiting_writes_are_made_at_exit(tmp_path):
+    out = tmp_path / "written"
+    script = f"""
+import memory_writer
+memory_writer.writer.submit("k", [], lambda messages: open({str(out)!r}, "w").write("done"))
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).parent, check=True, timeout=60)
+    assert out.read_text() == "done"
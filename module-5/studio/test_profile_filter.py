@@ -0,0 +1,32 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import profile_filter
+
+@pytest.mark.parametrize("text", [
+    "My name is Lance.", "I'm Priya, by the way", "i'm lance", "hi, this is Mateo", "I live in Lisbon now",
+    "I just moved to Denver", "I really enjoy chess", "I'm into jazz these days", "I don't live in Accra anymore",
+    "I no longer play chess", "I stopped biking last year",
+])
+def test_profile_statements_have_a_signal(text):
+    assert profile_filter.has_profile_signal(text)
+
+@pytest.mark.parametrize("text", [
+    "I'm tired today.", "I'm not sure about that.", "im fine", "i'm good, thanks", "I'm going to bed now.",
+    "This is great, thanks!", "I am a bit confused.", "I don't know.", "I don't think so.", "I do not understand.",
+    "I never thought of it that way.", "I stopped by the shop earlier.",
+])
+def test_small_talk_has_no_signal(text):
+    assert not profile_filter.has_profile_signal(text)
+
+def test_a_bare_answer_to_a_profile_question_has_a_signal():
+    assert profile_filter.turn_has_profile_signal([AIMessage("What's your name?"), HumanMessage("Lance")])
+    assert not profile_filter.turn_has_profile_signal([AIMessage("Anything else?"), HumanMessage("Lance")])
+
+def test_only_the_latest_user_message_counts():
+    messages = [HumanMessage("My name is Lance"), AIMessage("Nice to meet you!"), HumanMessage("Thanks")]
+    assert not profile_filter.turn_has_profile_signal(messages)
+
+def test_same_profile_ignores_key_order():
+    assert profile_filter.same_profile({"a": 1, "b": 2}, {"b": 2, "a": 1})
+    assert not profile_filter.same_profile({"a": 1}, None)
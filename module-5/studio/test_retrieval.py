@@ -0,0 +1,34 @@
+from langgraph.store.memory import InMemoryStore
+
+import configuration
+import retrieval
+
+MEMORIES = ["User likes hiking in the Alps", "User's sister is called Maya", "User works as a nurse",
+            "User is allergic to peanuts", "User plays the cello"]
+
+def store_with_memories(**kwargs):
+    store = InMemoryStore(**kwargs)
+    for i, content in enumerate(MEMORIES):
+        store.put(("memories", "u"), str(i), {"content": content})
+    return store
+
+def test_semantic_ranks_by_similarity():
+    found = retrieval.search(store_with_memories(), ("memories", "u"), "any tips for a peanut allergy?", k=1)
+    assert [item.key for item in found] == ["3"]
+
+def test_store_index_uses_the_index():
+    store = store_with_memories(index={"embed": retrieval.embed_texts, "dims": retrieval.INDEX_DIMS, "fields": ["content"]})
+    found = retrieval.search(store, ("memories", "u"), "playing the cello", k=1, use_index=True)
+    assert [item.key for item in found] == ["4"]
+    assert found[0].score is not None
+
+def test_store_index_falls_back_on_an_unindexed_store():
+    # Without an index the store would return the first memory regardless of the query
+    found = retrieval.search(store_with_memories(), ("memories", "u"), "playing the cello", k=1, use_index=True)
+    assert [item.key for item in found] == ["4"]
+
+def test_semantic_is_the_default_and_top_k_parses_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MEMORY_TOP_K", "3")
+    configurable = configuration.Configuration.from_runnable_config({"configurable": {}})
+    assert configurable.memory_retrieval == "semantic"
+    assert configurable.memory_top_k == 3
@@ -0,0 +1,105 @@
+""" Cold-start import time of every graph listed in the repository's langgraph.json files
+
+Usage:
+    python bench_import_time.py
+    python bench_import_time.py --json import_times.json
+    python bench_import_time.py --baseline import_times.json --tolerance 0.25
+
+Each graph module is imported in a fresh interpreter with `python -X importtime`
+from the directory of its langgraph.json, the way the langgraph-api server
+loads it. The import time is the cumulative time reported for the module
+itself (the median of `--repeats` runs); the heaviest direct imports are listed
+next to it. With `--baseline`, exits non-zero if any graph got slower than
+its recorded budget by more than `--tolerance` (a fraction).
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# "import time:  self [us] | cumulative | imported package", with the package indented by nesting depth
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def find_graphs(root: Path) -> list[tuple[str, Path, str]]:
+    """(graph id, langgraph.json directory, module name) of every graph, in file order"""
+    graphs = []
+    for config_path in sorted(root.glob("**/langgraph.json")):
+        with open(config_path) as f:
+            config = json.load(f)
+        for graph_id, spec in config.get("graphs", {}).items():
+            module_path = spec.split(":")[0]
+            graphs.append((f"{config_path.parent.relative_to(root)}:{graph_id}", config_path.parent, Path(module_path).stem))
+    return graphs
+
+def import_time(directory: Path, module: str) -> tuple[float, list[tuple[str, float]]]:
+    """Cumulative import time of `module` in seconds, and its direct imports by cumulative time"""
+    # Graphs that build a model at import need a key, but never call the API here
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-import-time")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=directory, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1]}")
+
+    total, children = None, []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, package = match.groups()
+        seconds = int(cumulative) / 1e6
+        # Imports are reported after the modules they pull in, so the module's own line comes last
+        if len(indent) == 3:
+            children.append((package, seconds))
+        elif len(indent) == 1 and package == module:
+            total = seconds
+    if total is None:
+        raise RuntimeError(f"no import time reported for {module}")
+    return total, sorted(children, key=lambda child: -child[1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Directory searched for langgraph.json files")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=3, help="Heaviest direct imports to list per graph")
+    parser.add_argument("--json", help="Write the import times (seconds) to this file")
+    parser.add_argument("--baseline", help="Import times of a previous --json run to use as budgets")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative growth over the baseline")
+    args = parser.parse_args()
+
+    results, failures = {}, []
+    print(f"{'graph':<52} {'import (ms)':>12}  heaviest imports")
+    for graph_id, directory, module in find_graphs(args.root):
+        try:
+            runs = [import_time(directory, module) for _ in range(args.repeats)]
+        except RuntimeError as error:
+            failures.append(f"{graph_id}: {error}")
+            print(f"{graph_id:<52} {'failed':>12}")
+            continue
+        total = statistics.median(run[0] for run in runs)
+        results[graph_id] = total
+        heaviest = ", ".join(f"{package} {seconds * 1000:.0f}" for package, seconds in runs[-1][1][:args.top])
+        print(f"{graph_id:<52} {total * 1000:>12.0f}  {heaviest}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print("\nFailed imports:\n  " + "\n  ".join(failures))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            budgets = json.load(f)
+        over = [f"{graph_id}: {budgets[graph_id] * 1000:.0f} -> {seconds * 1000:.0f} ms"
+                for graph_id, seconds in results.items()
+                if graph_id in budgets and seconds > budgets[graph_id] * (1 + args.tolerance)]
+        if over:
+            print("\nOver budget:\n  " + "\n  ".join(over))
+            sys.exit(1)
+        print(f"\nAll graphs within {args.tolerance:.0%} of their budget")
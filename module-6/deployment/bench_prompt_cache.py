@@ -0,0 +1,106 @@
+""" Cached versus uncached prompt tokens of task_mAIstro under each prompt layout
+
+Usage:
+    python bench_prompt_cache.py --turns 20
+
+Runs a conversation through the graph with a stub chat model that mimics
+provider-side prefix caching: a prompt reuses the longest prefix it shares
+with any earlier prompt, counted the way OpenAI does (nothing under 1024
+tokens, then in steps of 128), and reports it as `cache_read` in its usage
+metadata. Every turn adds a ToDo, so the memory contents change each turn.
+The totals come from prompt_cache.usage, as they would with the real model.
+"""
+import argparse
+import itertools
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+
+import prompt_cache
+import task_maistro
+
+# OpenAI prompt caching granularity
+MIN_CACHED_TOKENS = 1024
+CACHE_INCREMENT = 128
+
+def count_tokens(text: str) -> int:
+    return len(text) // 4
+
+class PrefixCachingChatModel(BaseChatModel):
+    """Asks for a ToDo update on every user message, then replies; reports prefix-cache hits in usage."""
+
+    prompts: list = []
+    turn: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefix-caching-stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _cached_tokens(self, prompt: str) -> int:
+        shared = 0
+        for previous in self.prompts:
+            length = 0
+            for a, b in zip(prompt, previous):
+                if a != b:
+                    break
+                length += 1
+            shared = max(shared, length)
+        tokens = count_tokens(prompt[:shared])
+        return tokens // CACHE_INCREMENT * CACHE_INCREMENT if tokens >= MIN_CACHED_TOKENS else 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "".join(f"{m.type}:{m.content}\n" for m in messages)
+        cached = self._cached_tokens(prompt)
+        self.prompts.append(prompt)
+        input_tokens = count_tokens(prompt)
+        # The memory contents may follow the conversation, so look at the last two messages
+        if messages[-1].type == "tool" or messages[-2].type == "tool":
+            message = AIMessage(content=f"Added that to your list (turn {self.turn}).")
+        else:
+            self.turn += 1
+            message = AIMessage(content="", tool_calls=[{"name": "UpdateMemory", "args": {"update_type": "todo"}, "id": f"call-{self.turn}"}])
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": 10, "total_tokens": input_tokens + 10,
+                                  "input_token_details": {"cache_read": cached}}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+def stub_extractor():
+    counter = itertools.count()
+
+    def extract(input):
+        n = next(counter)
+        return {"messages": [], "responses": [task_maistro.ToDo(task=f"Errand number {n}", time_to_complete=15, solutions=["Walk there"])],
+                "response_metadata": [{}]}
+    return RunnableLambda(extract)
+
+def run(layout: str, turns: int) -> dict:
+    task_maistro.model = PrefixCachingChatModel(callbacks=[prompt_cache.usage], prompts=[])
+    task_maistro.todo_extractor = stub_extractor()
+    prompt_cache.usage.reset()
+    graph = task_maistro.builder.compile(store=InMemoryStore(), checkpointer=MemorySaver())
+    # The role is padded so that the static prefix passes the caching minimum, as a full production prompt would
+    config = {"configurable": {"thread_id": layout, "user_id": layout, "prompt_layout": layout,
+                               "task_maistro_role": "You are a helpful task management assistant. " * 60}}
+    for turn in range(turns):
+        graph.invoke({"messages": [("user", f"Remind me to run errand number {turn}, it should not take long.")]}, config)
+    return prompt_cache.usage.stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'layout':<16} {'calls':>6} {'prompt tokens':>14} {'cached':>8} {'uncached':>9} {'cached %':>9}")
+    for layout in ["inline", "cache_friendly"]:
+        stats = run(layout, args.turns)
+        print(f"{layout:<16} {stats['calls']:>6} {stats['prompt_tokens']:>14} {stats['cached_tokens']:>8} "
+              f"{stats['uncached_tokens']:>9} {stats['cached_ratio']:>8.0%}")
@@ -0,0 +1,48 @@
+""" Per-turn cost of building the ToDo Trustcall extractor versus reusing the module-level one
+
+Usage:
+    python bench_todo_extractor.py --turns 200
+
+Compares what update_todos used to do on every turn (create_extractor plus
+with_listeners) with what it does now (with_listeners on the prebuilt
+todo_extractor). No model calls are made, so this only measures
+construction overhead.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from trustcall import create_extractor
+
+import task_maistro
+from task_maistro import Spy, ToDo
+
+def per_turn_construction():
+    spy = Spy()
+    return create_extractor(task_maistro.get_model(), tools=[ToDo], tool_choice="ToDo", enable_inserts=True).with_listeners(on_end=spy)
+
+def per_turn_listener():
+    spy = Spy()
+    return task_maistro.get_todo_extractor().with_listeners(on_end=spy)
+
+def mean_seconds(fn, turns: int) -> float:
+    # Warm up, so that one-off imports and the lazily built shared extractor are not counted
+    fn()
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn()
+    return (time.perf_counter() - start) / turns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    before = mean_seconds(per_turn_construction, args.turns)
+    after = mean_seconds(per_turn_listener, args.turns)
+    print(f"{'variant':<28} {'per turn (ms)':>14}")
+    print(f"{'create_extractor per turn':<28} {before * 1000:>14.3f}")
+    print(f"{'module-level extractor':<28} {after * 1000:>14.3f}")
+    print(f"saved per turn: {(before - after) * 1000:.3f} ms ({before / after:.0f}x)")
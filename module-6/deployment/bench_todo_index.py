@@ -0,0 +1,87 @@
+""" "What's due this week" through the deadline index versus a scan of the ToDo namespace
+
+Usage:
+    python bench_todo_index.py --tasks 10000 --store memory
+    python bench_todo_index.py --tasks 10000 --store sqlite
+
+Fills one user's ToDo list with `--tasks` tasks (deadlines spread over a year,
+mixed statuses) through todos.put_todos, then times todos.due_soon against
+searching the whole namespace and filtering by status and deadline in Python.
+The sqlite store (from langgraph-checkpoint-sqlite) stands in for a database-backed store.
+"""
+import argparse
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from langgraph.store.memory import InMemoryStore
+
+import configuration
+import memories
+import todos
+
+STATUSES = ["not started", "in progress", "done", "archived"]
+
+@contextmanager
+def open_store(kind: str):
+    if kind == "sqlite":
+        from langgraph.store.sqlite import SqliteStore
+        with SqliteStore.from_conn_string(":memory:") as store:
+            store.setup()
+            yield store
+    else:
+        yield InMemoryStore()
+
+def fill(store, configurable: configuration.Configuration, num_tasks: int, now: datetime, batch_size: int = 500):
+    rng = random.Random(0)
+    for start in range(0, num_tasks, batch_size):
+        items = []
+        for i in range(start, min(start + batch_size, num_tasks)):
+            due = now + timedelta(minutes=rng.randrange(365 * 24 * 60)) if rng.random() < 0.9 else None
+            items.append((f"task-{i}", {
+                "task": f"Task {i}",
+                "time_to_complete": rng.randrange(5, 120),
+                "deadline": due.isoformat() if due else None,
+                "solutions": ["do it"],
+                "status": rng.choice(STATUSES),
+            }))
+        todos.put_todos(store, None, configurable, items)
+
+def scan_due_soon(store, configurable: configuration.Configuration, now: datetime, days: int, num_tasks: int):
+    statuses = set(memories.todo_statuses(configurable))
+    end = now + timedelta(days=days)
+    items = store.search(memories.namespace("todo", configurable), limit=num_tasks)
+    due = [item for item in items
+           if item.value["status"] in statuses and todos.deadline(item) and now <= todos.deadline(item) <= end]
+    return sorted(due, key=todos.deadline)
+
+def timed(fn, repeats: int):
+    durations, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=7, help="Width of the due-soon window")
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    configurable = configuration.Configuration(user_id="benchmark-user")
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with open_store(args.store) as store:
+        fill(store, configurable, args.tasks, now)
+        scan_time, scanned = timed(lambda: scan_due_soon(store, configurable, now, args.days, args.tasks), args.repeats)
+        index_time, indexed = timed(lambda: todos.due_soon(store, configurable, args.days, now=now), args.repeats)
+
+    assert [item.key for item in scanned] == [item.key for item in indexed], "index and scan disagree"
+    print(f"{args.tasks} tasks, {args.store} store, {len(indexed)} due in the next {args.days} days")
+    print(f"{'full namespace scan':<22} {scan_time * 1000:>10.2f} ms")
+    print(f"{'deadline index':<22} {index_time * 1000:>10.2f} ms")
+    print(f"speedup: {scan_time / index_time:.0f}x")
@@ -12,6 +12,20 @@ class Configuration:
     user_id: str = "default-user"
     todo_category: str = "general" 
     task_maistro_role: str = "You are a helpful task management assistant. You help you create, organize, and manage the user's ToDo list."
+    # "parallel" lets the model request several memory updates per turn and runs them at once, "sequential" one at a time
+    update_mode: str = "sequential"
+    # "inline" keeps the memory in the one leading system message, "cache_friendly" moves it after the conversation so more of the prompt is cached
+    prompt_layout: str = "inline"
+    # "full" extracts memories from the whole thread, "incremental" from the messages since the last extraction only
+    extraction_mode: str = "full"
+    # Comma-separated ToDo statuses shown in the system prompt (done and archived tasks are hidden)
+    todo_statuses: str = "not started,in progress"
+    # Approximate token budget of the ToDo list in the system prompt
+    max_todo_tokens: int = 1000
+    # ToDos due within this many days are always loaded, through the deadline index (0 turns this off)
+    due_soon_days: int = 7
+    # Closed ToDos most relevant to the new messages passed to the extractor in incremental mode (open ones always are)
+    max_relevant_todos: int = 5
 
     @classmethod
     def from_runnable_config(
@@ -26,4 +40,10 @@ class Configuration:
             for f in fields(cls)
             if f.init
         }
-        return cls(**{k: v for k, v in values.items() if v})
\ No newline at end of file
+        # os.environ only holds strings, so parse the integer settings
+        int_fields = {f.name for f in fields(cls) if f.type is int}
+        return cls(**{
+            k: int(v) if isinstance(v, str) and k in int_fields else v
+            for k, v in values.items()
+            if v is not None
+        })
\ No newline at end of file
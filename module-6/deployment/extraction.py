@@ -0,0 +1,75 @@
+""" Incremental memory extraction for the task_mAIstro update nodes
+
+Passing the whole thread and every existing ToDo to Trustcall on each update
+makes the cost grow with the length of the conversation times the size of the
+list. In incremental mode, the id of the last message seen by the extractor is
+kept in the store as a high-water mark per thread and memory namespace, and the
+next update only sends the messages after it. Of the existing ToDos, it sends
+every open one, since new messages often refer to them without naming them
+("mark that done"), plus the closed ones that share the most terms with the
+new messages.
+"""
+import re
+from typing import Optional
+
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore, Item
+
+import configuration
+import memories
+
+# Namespace kind holding the high-water marks
+MARKS_KIND = "extraction_marks"
+MARK_KEY = "last_message"
+
+# ToDo statuses that are always passed to the extractor
+OPEN_STATUSES = ("not started", "in progress")
+
+# Words too common to tell ToDos apart
+STOPWORDS = frozenset("""
+    the and for are but not you your with this that have from they will would there their what about which when
+    make like time just know take into year some could them than then look only come over think also back after
+    use two how our work first well way even new want because any these give day most need should please can
+""".split())
+
+def thread_id(config: RunnableConfig) -> str:
+    """Thread the graph is running on; message ids, and so marks, are only meaningful within it"""
+    return (config or {}).get("configurable", {}).get("thread_id") or "default-thread"
+
+def _mark_namespace(configurable: configuration.Configuration, thread: str, kind: str) -> tuple[str, ...]:
+    # One namespace per memory kind, so that update nodes running in parallel write separate cache entries
+    return memories.namespace(MARKS_KIND, configurable) + (thread, kind)
+
+def get_mark(store: BaseStore, cache: Optional[dict], configurable: configuration.Configuration,
+             thread: str, kind: str) -> Optional[str]:
+    """Id of the last message of `thread` extracted into the `kind` namespace, from the run cache or the store"""
+    namespace = _mark_namespace(configurable, thread, kind)
+    entries = (cache or {}).get(memories.cache_key(namespace))
+    if entries is not None:
+        return entries[0]["value"]["message_id"] if entries else None
+    item = store.get(namespace, MARK_KEY)
+    return item.value["message_id"] if item else None
+
+def set_mark(store: BaseStore, cache: Optional[dict], configurable: configuration.Configuration,
+             thread: str, kind: str, message_id: str) -> dict[str, list[dict]]:
+    """Record the last message of `thread` extracted into the `kind` namespace, returning the `memory_cache` update"""
+    return memories.write_through(store, cache, _mark_namespace(configurable, thread, kind), [(MARK_KEY, {"message_id": message_id})])
+
+def new_messages(messages: list[AnyMessage], mark: Optional[str]) -> list[AnyMessage]:
+    """Messages after the one with id `mark` (none if it is the last), or all of them if it is not in the list"""
+    for i, message in enumerate(messages):
+        if message.id == mark:
+            return messages[i + 1:]
+    return messages
+
+def terms(text: str) -> set[str]:
+    return {word for word in re.findall(r"[a-z0-9]{3,}", text.lower()) if word not in STOPWORDS}
+
+def relevant_items(items: list[Item], messages: list[AnyMessage], limit: int) -> list[Item]:
+    """Every open ToDo, plus up to `limit` closed ones sharing the most terms with the messages, in their original order"""
+    message_terms = terms(" ".join(str(message.content) for message in messages))
+    open_items = {i for i, item in enumerate(items) if item.value.get("status", "not started") in OPEN_STATUSES}
+    overlaps = {i: len(terms(str(item.value)) & message_terms) for i, item in enumerate(items) if i not in open_items}
+    ranked = sorted((i for i, overlap in overlaps.items() if overlap), key=lambda i: -overlaps[i])[:limit]
+    return [items[i] for i in sorted(open_items.union(ranked))]
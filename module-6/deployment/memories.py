@@ -0,0 +1,175 @@
+""" Batched reads of the memories kept for a user by task_mAIstro
+
+task_mAIstro keeps three kinds of memory per (todo_category, user_id): the
+user profile, the ToDo list and the instructions for updating it. Instead of
+one store.search per kind, `load_memories` sends all the searches in a single
+store.batch call, which is one round trip to a remote (e.g. Postgres) store.
+ToDos are filtered by status in the store query itself (one search per shown
+status, in the same batch), so done and archived tasks are not fetched for the
+system prompt. update_todos loads every status instead, so that Trustcall can
+still patch or reopen a finished task rather than insert a duplicate. Callers
+can add searches of their own to the batch (`extra_ops`), e.g. the deadline
+index lookups of `todos.due_soon_ops`.
+
+Within a run, the graph itself makes the only writes to these namespaces, so
+the loaded items are also kept in a `memory_cache` state key, keyed by
+namespace. The update nodes write through it with `write_through`, and nodes
+that run later in the same run read the cache instead of the store. The cache
+is a state channel, so it is checkpointed: task_mAIstro replaces it when a run
+starts and empties it on the run's last turn (see `RESET`), so it never
+outlives the run it was loaded in.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional, Sequence
+
+from langgraph.store.base import BaseStore, Item, PutOp, SearchOp
+
+import configuration
+
+# Kinds of memory, in the order they appear in the system prompt
+MEMORY_KINDS = ("profile", "todo", "instructions")
+
+# Same as the default limit of store.search
+SEARCH_LIMIT = 10
+
+# ToDos fetched per shown status, before todos.render_todos ranks and caps them
+TODO_SEARCH_LIMIT = 100
+
+# Every status of the ToDo schema in task_maistro.py
+ALL_TODO_STATUSES = ("not started", "in progress", "done", "archived")
+
+def namespace(kind: str, configurable: configuration.Configuration) -> tuple[str, ...]:
+    """Store namespace holding the memories of `kind` for the configured user and category"""
+    return (kind, configurable.todo_category, configurable.user_id)
+
+@dataclass
+class Memories:
+    """The items of each memory kind, as returned by store.search"""
+    profile: list[Item] = field(default_factory=list)
+    todo: list[Item] = field(default_factory=list)
+    instructions: list[Item] = field(default_factory=list)
+
+    @property
+    def user_profile(self) -> Optional[dict]:
+        return self.profile[0].value if self.profile else None
+
+    @property
+    def user_instructions(self) -> str:
+        return self.instructions[0].value if self.instructions else ""
+
+def todo_statuses(configurable: configuration.Configuration) -> list[str]:
+    """ToDo statuses shown to the model, from the comma-separated `todo_statuses` setting"""
+    return [status.strip() for status in configurable.todo_statuses.split(",") if status.strip()]
+
+def _search_ops(configurable: configuration.Configuration, kinds: Iterable[str], limit: int,
+                statuses: Optional[Iterable[str]]) -> list[tuple[str, SearchOp]]:
+    ops = []
+    for kind in kinds:
+        if kind == "todo":
+            # The store filter has no "$in", so search once per status
+            ops.extend((kind, SearchOp(namespace_prefix=namespace(kind, configurable), filter={"status": status},
+                                       limit=TODO_SEARCH_LIMIT))
+                       for status in (statuses if statuses is not None else todo_statuses(configurable)))
+        else:
+            ops.append((kind, SearchOp(namespace_prefix=namespace(kind, configurable), limit=limit)))
+    return ops
+
+def _group(ops: list[tuple[str, SearchOp]], results: list[list[Item]]) -> Memories:
+    items = {kind: [] for kind, _ in ops}
+    seen = set()
+    for (kind, _), result in zip(ops, results):
+        # The same item can be found by more than one search (e.g. through an index as well)
+        for item in result:
+            if (kind, item.key) not in seen:
+                seen.add((kind, item.key))
+                items[kind].append(item)
+    return Memories(**items)
+
+def load_memories(store: BaseStore, configurable: configuration.Configuration,
+                  kinds: Iterable[str] = MEMORY_KINDS, limit: int = SEARCH_LIMIT,
+                  statuses: Optional[Iterable[str]] = None,
+                  extra_ops: Sequence[tuple[str, SearchOp]] = ()) -> Memories:
+    """Load the requested memory kinds of the configured user in one store round trip.
+
+    ToDos are loaded with the given `statuses`, by default the ones shown in the system prompt.
+    `extra_ops` are (kind, SearchOp) pairs sent in the same batch; their results are added
+    to that kind, skipping keys already loaded.
+    """
+    ops = _search_ops(configurable, kinds, limit, statuses) + list(extra_ops)
+    return _group(ops, store.batch([op for _, op in ops]))
+
+async def aload_memories(store: BaseStore, configurable: configuration.Configuration,
+                         kinds: Iterable[str] = MEMORY_KINDS, limit: int = SEARCH_LIMIT,
+                         statuses: Optional[Iterable[str]] = None,
+                         extra_ops: Sequence[tuple[str, SearchOp]] = ()) -> Memories:
+    """Async version of `load_memories`"""
+    ops = _search_ops(configurable, kinds, limit, statuses) + list(extra_ops)
+    return _group(ops, await store.abatch([op for _, op in ops]))
+
+### Run-scoped cache
+
+def cache_key(namespace: tuple[str, ...]) -> str:
+    """Cache key of a namespace, e.g. "todo/general/default-user" """
+    return "/".join(namespace)
+
+# Key of a `memory_cache` update that replaces the whole cache instead of merging into it
+RESET = "__reset__"
+
+def merge_cache(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer for the `memory_cache` state key: newer namespaces replace older ones, and a RESET update replaces all"""
+    right = right or {}
+    if right.get(RESET):
+        return {key: entries for key, entries in right.items() if key != RESET}
+    return {**(left or {}), **right}
+
+def reset_cache(entries: Optional[dict] = None) -> dict:
+    """`memory_cache` update dropping everything cached so far, keeping only `entries`"""
+    return {RESET: True, **(entries or {})}
+
+def _to_cached(item: Item) -> dict[str, Any]:
+    # Only the Item fields, so that search results (which also carry a score) round trip
+    return {"namespace": list(item.namespace), "key": item.key, "value": item.value,
+            "created_at": item.created_at.isoformat(), "updated_at": item.updated_at.isoformat()}
+
+def snapshot(user_memories: Memories, configurable: configuration.Configuration,
+             kinds: Iterable[str] = MEMORY_KINDS) -> dict[str, list[dict]]:
+    """Cache entries for loaded memories, to return as the `memory_cache` state update"""
+    return {cache_key(namespace(kind, configurable)): [_to_cached(item) for item in getattr(user_memories, kind)]
+            for kind in kinds}
+
+def from_cache(cache: Optional[dict], configurable: configuration.Configuration,
+               kinds: Iterable[str] = MEMORY_KINDS) -> Optional[Memories]:
+    """The cached memories of the configured user, or None unless every kind is cached"""
+    cache = cache or {}
+    kinds = list(kinds)
+    keys = [cache_key(namespace(kind, configurable)) for kind in kinds]
+    if not all(key in cache for key in keys):
+        return None
+    return Memories(**{kind: [Item(**entry) for entry in cache[key]] for kind, key in zip(kinds, keys)})
+
+def write_through(store: BaseStore, cache: Optional[dict], namespace: tuple[str, ...],
+                  items: list[tuple[str, dict[str, Any]]], extra_ops: Sequence[PutOp] = ()) -> dict[str, list[dict]]:
+    """Put (key, value) items in one store.batch call and return the `memory_cache` state update holding them.
+
+    `extra_ops` (e.g. index maintenance) are sent in the same batch.
+    """
+    store.batch([PutOp(namespace=namespace, key=key, value=value) for key, value in items] + list(extra_ops))
+    entries = list((cache or {}).get(cache_key(namespace), []))
+    positions = {entry["key"]: i for i, entry in enumerate(entries)}
+    now = datetime.now(timezone.utc).isoformat()
+    for key, value in items:
+        if key in positions:
+            entries[positions[key]] = {**entries[positions[key]], "value": value, "updated_at": now}
+        else:
+            positions[key] = len(entries)
+            entries.append({"namespace": list(namespace), "key": key, "value": value, "created_at": now, "updated_at": now})
+    return {cache_key(namespace): entries}
+
+def cached_search(store: BaseStore, cache: Optional[dict], configurable: configuration.Configuration,
+                  kind: str, limit: int = SEARCH_LIMIT) -> list[Item]:
+    """Memories of one kind from the run cache, falling back to a store search"""
+    cached = from_cache(cache, configurable, kinds=[kind])
+    if cached is None:
+        cached = load_memories(store, configurable, kinds=[kind], limit=limit)
+    return getattr(cached, kind)
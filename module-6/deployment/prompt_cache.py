@@ -0,0 +1,52 @@
+""" Accounting of provider-side prompt caching
+
+OpenAI (and other providers) reuse the longest previously seen prompt prefix
+and report the reused tokens in the response usage metadata, as
+`input_token_details["cache_read"]`. PromptCacheUsage is a callback handler
+that adds these up for every chat model call it is attached to, so the effect
+of the prompt layout can be seen as cached versus uncached prompt tokens.
+"""
+import threading
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+class PromptCacheUsage(BaseCallbackHandler):
+    """Totals of cached and uncached prompt tokens over the chat model calls it observes."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                with self._lock:
+                    self.calls += 1
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.cached_tokens += usage.get("input_token_details", {}).get("cache_read", 0) or 0
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "uncached_tokens": self.prompt_tokens - self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+# Attached to the task_maistro model, so it also counts the calls the Trustcall extractors make
+usage = PromptCacheUsage()
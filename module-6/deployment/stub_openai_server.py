@@ -0,0 +1,171 @@
+""" A local, OpenAI-compatible chat completions server with canned task_mAIstro behaviour
+
+Usage:
+    python stub_openai_server.py --port 8099 --latency 0.2
+
+Point the graph at it with OPENAI_BASE_URL=http://localhost:8099/v1 (from a
+container started by docker-compose, use http://host.docker.internal:8099/v1).
+No API key is checked and no request leaves the machine.
+
+Replies depend on the tools offered in the request:
+- UpdateMemory (task_mAIstro): after a user message, a tool call whose update_type
+  is guessed from the message ("my name is..." -> user, "I prefer..." -> instructions,
+  otherwise todo); after the tool results, a short text reply.
+- ToDo / Profile (the Trustcall extractors): a valid call of that tool built from the
+  last user message.
+- No tools (update_instructions): short instructions text.
+
+Both plain and streamed (SSE) completions are supported, with usage reported.
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFILE_PATTERN = re.compile(r"\b(my name is|i am|i'm|i live|i work)\b", re.IGNORECASE)
+INSTRUCTIONS_PATTERN = re.compile(r"\b(i prefer|always|never|from now on)\b", re.IGNORECASE)
+
+def _text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+def _last_user_text(messages: list[dict]) -> str:
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return _text(message)
+    return ""
+
+def reply(request: dict) -> tuple[str, list[dict]]:
+    """Content and tool calls (name, arguments) of the canned reply to a chat completions request"""
+    tools = {tool["function"]["name"] for tool in request.get("tools", [])}
+    messages = request["messages"]
+    user_text = _last_user_text(messages)
+
+    if "UpdateMemory" in tools:
+        # Memory contents may follow the conversation as a system message, so skip those
+        conversation = [message for message in messages if message["role"] != "system"]
+        if conversation and conversation[-1]["role"] == "user":
+            if PROFILE_PATTERN.search(user_text):
+                update_type = "user"
+            elif INSTRUCTIONS_PATTERN.search(user_text):
+                update_type = "instructions"
+            else:
+                update_type = "todo"
+            return "", [{"name": "UpdateMemory", "arguments": {"update_type": update_type}}]
+        return "Done, I've noted that.", []
+    if "ToDo" in tools:
+        return "", [{"name": "ToDo", "arguments": {
+            "task": user_text[:120] or "Follow up",
+            "time_to_complete": 30,
+            "solutions": ["Block 30 minutes in the calendar"],
+            "status": "not started",
+        }}]
+    if "Profile" in tools:
+        return "", [{"name": "Profile", "arguments": {"name": "Load Test User", "interests": ["load testing"]}}]
+    return "Keep ToDos short and add a deadline when one is mentioned.", []
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """Serves /v1/chat/completions after sleeping `latency` seconds; counts the requests it served."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float = 0.0):
+        super().__init__(address, StubOpenAIHandler)
+        self.latency = latency
+        self.requests = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "prompt_tokens": self.prompt_tokens}
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"{self.path} is not served by the stub"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.server.latency)
+
+        content, tool_calls = reply(request)
+        tool_calls = [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                       "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+                      for call in tool_calls]
+        # ~4 characters per token
+        prompt_tokens = len(json.dumps(request["messages"])) // 4
+        completion_tokens = (len(content) + sum(len(call["function"]["arguments"]) for call in tool_calls)) // 4 + 1
+        self.server.record(prompt_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": 0}}
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        completion = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": request.get("model", "stub")}
+
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": content or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json(200, {**completion, "object": "chat.completion", "usage": usage,
+                                  "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]})
+            return
+
+        # Server-sent events: the role, the content or tool calls, the finish reason, then the usage if asked for
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk = {**completion, "object": "chat.completion.chunk"}
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": word} for word in re.findall(r"\S+\s*", content)]
+        deltas += [{"tool_calls": [{"index": i, **call}]} for i, call in enumerate(tool_calls)]
+        events = [{**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+        events.append({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append({**chunk, "choices": [], "usage": usage})
+        for event in itertools.chain((json.dumps(event) for event in events), ["[DONE]"]):
+            self.wfile.write(f"data: {event}\n\n".encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+def start(port: int = 0, latency: float = 0.0) -> StubOpenAIServer:
+    """Serve on a background thread; the bound port is `server.server_address[1]`"""
+    server = StubOpenAIServer(("0.0.0.0", port), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds slept before every completion")
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(("0.0.0.0", args.port), args.latency)
+    print(f"Stub OpenAI server on http://localhost:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(server.stats())
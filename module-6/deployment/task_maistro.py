@@ -1,24 +1,24 @@
+import threading
 import uuid
 from datetime import datetime
 
 from pydantic import BaseModel, Field
 
-from trustcall import create_extractor
-
-from typing import Literal, Optional, TypedDict
+from typing import Annotated, Literal, Optional, TypedDict
 
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import merge_message_runs
-from langchain_core.messages import SystemMessage, HumanMessage
-
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, MessagesState, START, END
+from langgraph.types import Send
 from langgraph.store.base import BaseStore
-from langgraph.store.memory import InMemoryStore
 
 import configuration
+import extraction
+import memories
+import prompt_cache
+import todos
 
 ## Utilities 
 
@@ -130,6 +130,14 @@ class ToDo(BaseModel):
         default="not started"
     )
 
+## State
+
+class TaskMaistroState(MessagesState):
+    # Memories read from or written to the store in this run, keyed by namespace (see memories.py)
+    memory_cache: Annotated[dict, memories.merge_cache]
+    # Ids of the UpdateMemory calls answered by an update node, set when it is started with Send
+    tool_call_ids: list[str]
+
 ## Initialize the model and tools
 
 # Update memory tool
@@ -137,32 +145,69 @@ class UpdateMemory(TypedDict):
     """ Decision on what memory type to update """
     update_type: Literal['user', 'todo', 'instructions']
 
-# Initialize the model
-model = ChatOpenAI(model="gpt-4o", temperature=0)
+# The model and the Trustcall extractors are built on first use rather than at import,
+# which keeps langchain_openai and trustcall (and their imports) off the cold start path.
+# Assigning to these names (e.g. a fake model in a benchmark) takes precedence.
+model = None
+profile_extractor = None
+todo_extractor = None
+_lazy_lock = threading.Lock()
+
+def get_model():
+    """The chat model, created on first use"""
+    global model
+    with _lazy_lock:
+        if model is None:
+            from langchain_openai import ChatOpenAI
+            model = ChatOpenAI(model="gpt-4o", temperature=0, callbacks=[prompt_cache.usage])
+        return model
 
 ## Create the Trustcall extractors for updating the user profile and ToDo list
-profile_extractor = create_extractor(
-    model,
-    tools=[Profile],
-    tool_choice="Profile",
-)
+def get_profile_extractor():
+    """The Trustcall extractor for the user profile, created on first use"""
+    global profile_extractor
+    if profile_extractor is None:
+        from trustcall import create_extractor
+        extractor = create_extractor(
+            get_model(),
+            tools=[Profile],
+            tool_choice="Profile",
+        )
+        with _lazy_lock:
+            profile_extractor = profile_extractor or extractor
+    return profile_extractor
+
+def get_todo_extractor():
+    """The Trustcall extractor for the ToDo list, created on first use"""
+    global todo_extractor
+    if todo_extractor is None:
+        from trustcall import create_extractor
+        extractor = create_extractor(
+            get_model(),
+            tools=[ToDo],
+            tool_choice="ToDo",
+            enable_inserts=True
+        )
+        with _lazy_lock:
+            todo_extractor = todo_extractor or extractor
+    return todo_extractor
 
 ## Prompts 
 
 # Chatbot instruction for choosing what to update and what tools to call 
-MODEL_SYSTEM_MESSAGE = """{task_maistro_role} 
+MEMORY_OVERVIEW = """{task_maistro_role} 
 
 You have a long term memory which keeps track of three things:
 1. The user's profile (general information about them) 
 2. The user's ToDo list
-3. General instructions for updating the ToDo list
+3. General instructions for updating the ToDo list"""
 
-Here is the current User Profile (may be empty if no information has been collected yet):
+MEMORY_CONTENTS = """Here is the current User Profile (may be empty if no information has been collected yet):
 <user_profile>
 {user_profile}
 </user_profile>
 
-Here is the current ToDo List (may be empty if no tasks have been added yet):
+Here is the current ToDo List, most urgent first (may be empty if no tasks have been added yet; done and archived tasks are not shown):
 <todo>
 {todo}
 </todo>
@@ -170,9 +215,9 @@ Here is the current ToDo List (may be empty if no tasks have been added yet):
 Here are the current user-specified preferences for updating the ToDo list (may be empty if no preferences have been specified yet):
 <instructions>
 {instructions}
-</instructions>
+</instructions>"""
 
-Here are your instructions for reasoning about the user's messages:
+REASONING_INSTRUCTIONS = """Here are your instructions for reasoning about the user's messages:
 
 1. Reason carefully about the user's messages as presented below. 
 
@@ -190,6 +235,17 @@ Here are your instructions for reasoning about the user's messages:
 
 5. Respond naturally to user user after a tool call was made to save memories, or if no tool call was made."""
 
+MODEL_SYSTEM_MESSAGE = "\n\n".join([MEMORY_OVERVIEW, MEMORY_CONTENTS, REASONING_INSTRUCTIONS])
+
+# Cache-friendly layout: the static part comes first and is byte-identical across turns,
+# and the memory contents follow the conversation, so that provider-side prompt caching
+# can reuse the static instructions and the whole chat history
+STATIC_SYSTEM_MESSAGE = "\n\n".join([
+    MEMORY_OVERVIEW,
+    "The current contents of your long term memory are given after the conversation.",
+    REASONING_INSTRUCTIONS,
+])
+
 # Trustcall instruction
 TRUSTCALL_INSTRUCTION = """Reflect on following interaction. 
 
@@ -212,58 +268,74 @@ Your current instructions are:
 
 ## Node definitions
 
-def task_mAIstro(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def answered_tool_calls(state: TaskMaistroState) -> list[str]:
+    """Ids of the UpdateMemory calls an update node answers: those it was sent, else the first one"""
+    return state.get("tool_call_ids") or [state['messages'][-1].tool_calls[0]['id']]
+
+def task_mAIstro(state: TaskMaistroState, config: RunnableConfig, store: BaseStore):
 
     """Load memories from the store and use them to personalize the chatbot's response."""
     
     # Get the user ID from the config
     configurable = configuration.Configuration.from_runnable_config(config)
-    user_id = configurable.user_id
-    todo_category = configurable.todo_category
     task_maistro_role = configurable.task_maistro_role
 
-   # Retrieve profile memory from the store
-    namespace = ("profile", todo_category, user_id)
-    memories = store.search(namespace)
-    if memories:
-        user_profile = memories[0].value
-    else:
-        user_profile = None
-
-    # Retrieve people memory from the store
-    namespace = ("todo", todo_category, user_id)
-    memories = store.search(namespace)
-    todo = "\n".join(f"{mem.value}" for mem in memories)
-
-    # Retrieve custom instructions
-    namespace = ("instructions", todo_category, user_id)
-    memories = store.search(namespace)
-    if memories:
-        instructions = memories[0].value
-    else:
-        instructions = ""
+    # Returning from an update node, reuse the memories cached (and written through) in this run
+    user_memories = None
+    if isinstance(state["messages"][-1], ToolMessage):
+        user_memories = memories.from_cache(state.get("memory_cache"), configurable)
+
+    # Otherwise retrieve the profile, ToDo list (including what is due soon, from the deadline index)
+    # and custom instructions in one round trip, replacing whatever an earlier (e.g. failed) run left in the cache
+    cache_update = {}
+    if user_memories is None:
+        user_memories = memories.load_memories(store, configurable,
+                                               extra_ops=todos.due_soon_ops(configurable, configurable.due_soon_days))
+        cache_update = memories.reset_cache(memories.snapshot(user_memories, configurable))
+
+    user_profile = user_memories.user_profile
+    todo = todos.render_todos(user_memories.todo, configurable.max_todo_tokens, memories.todo_statuses(configurable))
+    instructions = user_memories.user_instructions
     
-    system_msg = MODEL_SYSTEM_MESSAGE.format(task_maistro_role=task_maistro_role, user_profile=user_profile, todo=todo, instructions=instructions)
+    if configurable.prompt_layout == "cache_friendly":
+        prompt = ([SystemMessage(content=STATIC_SYSTEM_MESSAGE.format(task_maistro_role=task_maistro_role))]
+                  + state["messages"]
+                  + [SystemMessage(content=MEMORY_CONTENTS.format(user_profile=user_profile, todo=todo, instructions=instructions))])
+    else:
+        system_msg = MODEL_SYSTEM_MESSAGE.format(task_maistro_role=task_maistro_role, user_profile=user_profile, todo=todo, instructions=instructions)
+        prompt = [SystemMessage(content=system_msg)]+state["messages"]
 
     # Respond using memory as well as the chat history
-    response = model.bind_tools([UpdateMemory], parallel_tool_calls=False).invoke([SystemMessage(content=system_msg)]+state["messages"])
+    parallel_tool_calls = configurable.update_mode == "parallel"
+    response = get_model().bind_tools([UpdateMemory], parallel_tool_calls=parallel_tool_calls).invoke(prompt)
+
+    # Without tool calls this is the last turn of the run, so the cache is emptied rather than checkpointed with the thread
+    if not response.tool_calls:
+        cache_update = memories.reset_cache()
 
-    return {"messages": [response]}
+    return {"messages": [response], "memory_cache": cache_update}
 
-def update_profile(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_profile(state: TaskMaistroState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
     # Get the user ID from the config
     configurable = configuration.Configuration.from_runnable_config(config)
-    user_id = configurable.user_id
-    todo_category = configurable.todo_category
 
     # Define the namespace for the memories
-    namespace = ("profile", todo_category, user_id)
+    namespace = memories.namespace("profile", configurable)
+
+    # Retrieve the most recent memories for context, as cached by task_mAIstro
+    existing_items = memories.cached_search(store, state.get("memory_cache"), configurable, "profile")
 
-    # Retrieve the most recent memories for context
-    existing_items = store.search(namespace)
+    # In incremental mode, only extract from the messages of this thread since the last update of this namespace
+    history = state["messages"][:-1]
+    if configurable.extraction_mode == "incremental":
+        thread = extraction.thread_id(config)
+        history = extraction.new_messages(history, extraction.get_mark(store, state.get("memory_cache"), configurable, thread, "profile"))
+        if not history:
+            return {"messages": [{"role": "tool", "content": "no new messages, profile unchanged", "tool_call_id": tool_call_id}
+                                 for tool_call_id in answered_tool_calls(state)]}
 
     # Format the existing memories for the Trustcall extractor
     tool_name = "Profile"
@@ -275,36 +347,45 @@ def update_profile(state: MessagesState, config: RunnableConfig, store: BaseStor
 
     # Merge the chat history and the instruction
     TRUSTCALL_INSTRUCTION_FORMATTED=TRUSTCALL_INSTRUCTION.format(time=datetime.now().isoformat())
-    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + state["messages"][:-1]))
+    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + history))
 
     # Invoke the extractor
-    result = profile_extractor.invoke({"messages": updated_messages, 
+    result = get_profile_extractor().invoke({"messages": updated_messages, 
                                          "existing": existing_memories})
 
-    # Save save the memories from Trustcall to the store
-    for r, rmeta in zip(result["responses"], result["response_metadata"]):
-        store.put(namespace,
-                  rmeta.get("json_doc_id", str(uuid.uuid4())),
-                  r.model_dump(mode="json"),
-            )
-    tool_calls = state['messages'][-1].tool_calls
+    # Save the memories from Trustcall to the store, writing them through to the run cache
+    cache_update = memories.write_through(store, state.get("memory_cache"), namespace, [
+        (rmeta.get("json_doc_id", str(uuid.uuid4())), r.model_dump(mode="json"))
+        for r, rmeta in zip(result["responses"], result["response_metadata"])
+    ])
+    if configurable.extraction_mode == "incremental":
+        cache_update.update(extraction.set_mark(store, state.get("memory_cache"), configurable, thread, "profile", state["messages"][-2].id))
     # Return tool message with update verification
-    return {"messages": [{"role": "tool", "content": "updated profile", "tool_call_id":tool_calls[0]['id']}]}
+    return {"messages": [{"role": "tool", "content": "updated profile", "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_calls(state)], "memory_cache": cache_update}
 
-def update_todos(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_todos(state: TaskMaistroState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
     # Get the user ID from the config
     configurable = configuration.Configuration.from_runnable_config(config)
-    user_id = configurable.user_id
-    todo_category = configurable.todo_category
-
-    # Define the namespace for the memories
-    namespace = ("todo", todo_category, user_id)
 
-    # Retrieve the most recent memories for context
-    existing_items = store.search(namespace)
+    # Retrieve the ToDos of every status, not only the ones cached by task_mAIstro for the prompt,
+    # so that Trustcall can patch or reopen done and archived tasks instead of inserting duplicates
+    existing_items = memories.load_memories(store, configurable, kinds=["todo"], statuses=memories.ALL_TODO_STATUSES,
+                                            extra_ops=todos.due_soon_ops(configurable, configurable.due_soon_days,
+                                                                         statuses=memories.ALL_TODO_STATUSES)).todo
+
+    # In incremental mode, only extract from the messages of this thread since the last update of this namespace
+    history = state["messages"][:-1]
+    if configurable.extraction_mode == "incremental":
+        thread = extraction.thread_id(config)
+        history = extraction.new_messages(history, extraction.get_mark(store, state.get("memory_cache"), configurable, thread, "todo"))
+        if not history:
+            return {"messages": [{"role": "tool", "content": "no new messages, ToDo list unchanged", "tool_call_id": tool_call_id}
+                                 for tool_call_id in answered_tool_calls(state)]}
+        existing_items = extraction.relevant_items(existing_items, history, configurable.max_relevant_todos)
 
     # Format the existing memories for the Trustcall extractor
     tool_name = "ToDo"
@@ -316,81 +397,79 @@ def update_todos(state: MessagesState, config: RunnableConfig, store: BaseStore)
 
     # Merge the chat history and the instruction
     TRUSTCALL_INSTRUCTION_FORMATTED=TRUSTCALL_INSTRUCTION.format(time=datetime.now().isoformat())
-    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + state["messages"][:-1]))
+    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + history))
 
     # Initialize the spy for visibility into the tool calls made by Trustcall
     spy = Spy()
-    
-    # Create the Trustcall extractor for updating the ToDo list 
-    todo_extractor = create_extractor(
-    model,
-    tools=[ToDo],
-    tool_choice=tool_name,
-    enable_inserts=True
-    ).with_listeners(on_end=spy)
 
-    # Invoke the extractor
-    result = todo_extractor.invoke({"messages": updated_messages, 
-                                         "existing": existing_memories})
+    # Add the spy as a listener to the shared extractor; the binding is cheap and keeps the
+    # callbacks inherited from the graph run (tracing, streamed messages)
+    todo_extractor_see_all_tool_calls = get_todo_extractor().with_listeners(on_end=spy)
 
-    # Save save the memories from Trustcall to the store
-    for r, rmeta in zip(result["responses"], result["response_metadata"]):
-        store.put(namespace,
-                  rmeta.get("json_doc_id", str(uuid.uuid4())),
-                  r.model_dump(mode="json"),
-            )
+    # Invoke the extractor
+    result = todo_extractor_see_all_tool_calls.invoke({"messages": updated_messages, 
+                                                       "existing": existing_memories})
+
+    # Save the memories from Trustcall to the store, writing them through to the run cache and the deadline index
+    cache_update = todos.put_todos(store, state.get("memory_cache"), configurable, [
+        (rmeta.get("json_doc_id", str(uuid.uuid4())), r.model_dump(mode="json"))
+        for r, rmeta in zip(result["responses"], result["response_metadata"])
+    ])
+    if configurable.extraction_mode == "incremental":
+        cache_update.update(extraction.set_mark(store, state.get("memory_cache"), configurable, thread, "todo", state["messages"][-2].id))
         
-    # Respond to the tool call made in task_mAIstro, confirming the update    
-    tool_calls = state['messages'][-1].tool_calls
-
     # Extract the changes made by Trustcall and add the the ToolMessage returned to task_mAIstro
     todo_update_msg = extract_tool_info(spy.called_tools, tool_name)
-    return {"messages": [{"role": "tool", "content": todo_update_msg, "tool_call_id":tool_calls[0]['id']}]}
 
-def update_instructions(state: MessagesState, config: RunnableConfig, store: BaseStore):
+    # Respond to the tool calls made in task_mAIstro, confirming the update
+    return {"messages": [{"role": "tool", "content": todo_update_msg, "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_calls(state)], "memory_cache": cache_update}
+
+def update_instructions(state: TaskMaistroState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
     # Get the user ID from the config
     configurable = configuration.Configuration.from_runnable_config(config)
-    user_id = configurable.user_id
-    todo_category = configurable.todo_category
     
-    namespace = ("instructions", todo_category, user_id)
+    namespace = memories.namespace("instructions", configurable)
 
-    existing_memory = store.get(namespace, "user_instructions")
+    existing_items = memories.cached_search(store, state.get("memory_cache"), configurable, "instructions")
+    existing_memory = next((item for item in existing_items if item.key == "user_instructions"), None)
         
     # Format the memory in the system prompt
     system_msg = CREATE_INSTRUCTIONS.format(current_instructions=existing_memory.value if existing_memory else None)
-    new_memory = model.invoke([SystemMessage(content=system_msg)]+state['messages'][:-1] + [HumanMessage(content="Please update the instructions based on the conversation")])
+    new_memory = get_model().invoke([SystemMessage(content=system_msg)]+state['messages'][:-1] + [HumanMessage(content="Please update the instructions based on the conversation")])
 
     # Overwrite the existing memory in the store 
     key = "user_instructions"
-    store.put(namespace, key, {"memory": new_memory.content})
-    tool_calls = state['messages'][-1].tool_calls
+    cache_update = memories.write_through(store, state.get("memory_cache"), namespace, [(key, {"memory": new_memory.content})])
     # Return tool message with update verification
-    return {"messages": [{"role": "tool", "content": "updated instructions", "tool_call_id":tool_calls[0]['id']}]}
+    return {"messages": [{"role": "tool", "content": "updated instructions", "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_calls(state)], "memory_cache": cache_update}
 
 # Conditional edge
-def route_message(state: MessagesState, config: RunnableConfig, store: BaseStore) -> Literal[END, "update_todos", "update_instructions", "update_profile"]:
+
+# Update node for each UpdateMemory update_type
+UPDATE_NODES = {"user": "update_profile", "todo": "update_todos", "instructions": "update_instructions"}
+def route_message(state: TaskMaistroState, config: RunnableConfig, store: BaseStore) -> Literal[END, "update_todos", "update_instructions", "update_profile"]:
 
     """Reflect on the memories and chat history to decide whether to update the memory collection."""
     message = state['messages'][-1]
     if len(message.tool_calls) ==0:
         return END
+    elif configuration.Configuration.from_runnable_config(config).update_mode == "parallel":
+        # Run one update node per memory kind at once, each answering all the calls for its kind
+        tool_call_ids = {}
+        for tool_call in message.tool_calls:
+            tool_call_ids.setdefault(UPDATE_NODES[tool_call['args']['update_type']], []).append(tool_call['id'])
+        return [Send(node, {**state, "tool_call_ids": ids}) for node, ids in tool_call_ids.items()]
     else:
         tool_call = message.tool_calls[0]
-        if tool_call['args']['update_type'] == "user":
-            return "update_profile"
-        elif tool_call['args']['update_type'] == "todo":
-            return "update_todos"
-        elif tool_call['args']['update_type'] == "instructions":
-            return "update_instructions"
-        else:
-            raise ValueError
+        return UPDATE_NODES[tool_call['args']['update_type']]
 
 # Create the graph + all nodes
-builder = StateGraph(MessagesState, config_schema=configuration.Configuration)
+builder = StateGraph(TaskMaistroState, config_schema=configuration.Configuration)
 
 # Define the flow of the memory extraction process
 builder.add_node(task_mAIstro)
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.base import Item
+from langgraph.store.memory import InMemoryStore
+
+import configuration
+import extraction
+
+def todo(key, task, status="not started"):
+    now = datetime.now(timezone.utc)
+    return Item(value={"task": task, "status": status}, key=key, namespace=("todo",), created_at=now, updated_at=now)
+
+MESSAGES = [HumanMessage("Book the dentist", id="1"), AIMessage("Added it", id="2"), HumanMessage("Thanks", id="3")]
+
+def test_new_messages_after_the_mark():
+    assert [m.id for m in extraction.new_messages(MESSAGES, "1")] == ["2", "3"]
+
+def test_new_messages_empty_when_mark_is_last():
+    assert extraction.new_messages(MESSAGES, "3") == []
+
+def test_new_messages_all_when_mark_is_unknown():
+    assert extraction.new_messages(MESSAGES, None) == MESSAGES
+    assert extraction.new_messages(MESSAGES, "other-thread-id") == MESSAGES
+
+def test_open_todos_are_kept_without_shared_terms():
+    items = [todo("a", "Book the dentist"), todo("b", "Renew passport", status="in progress")]
+    kept = extraction.relevant_items(items, [HumanMessage("mark that done")], limit=5)
+    assert [item.key for item in kept] == ["a", "b"]
+
+def test_closed_todos_are_ranked_by_shared_terms_and_capped():
+    items = [
+        todo("a", "Buy milk at the store", status="done"),
+        todo("b", "Renew passport", status="done"),
+        todo("c", "Call plumber"),
+        todo("d", "Buy milk and eggs", status="archived"),
+    ]
+    kept = extraction.relevant_items(items, [HumanMessage("I need to buy milk and eggs again")], limit=1)
+    assert [item.key for item in kept] == ["c", "d"]
+
+def test_marks_are_kept_per_thread():
+    store = InMemoryStore()
+    configurable = configuration.Configuration()
+    extraction.set_mark(store, None, configurable, "thread-1", "todo", "m1")
+    assert extraction.get_mark(store, None, configurable, "thread-1", "todo") == "m1"
+    assert extraction.get_mark(store, None, configurable, "thread-2", "todo") is None
+
+def test_thread_id_from_config():
+    assert extraction.thread_id({"configurable": {"thread_id": "t"}}) == "t"
+    assert extraction.thread_id({}) == "default-thread"
+
+def test_extraction_mode_defaults_to_full():
+    assert configuration.Configuration().extraction_mode == "full"
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+from langgraph.store.memory import InMemoryStore
+
+import configuration
+import memories
+import todos
+
+NOW = datetime(2026, 3, 2, 9, tzinfo=timezone.utc)
+
+def todo(task, days, status="not started"):
+    return {"task": task, "status": status, "deadline": (NOW + timedelta(days=days)).isoformat()}
+
+def test_due_between_follows_deadline_and_status_changes():
+    store, configurable = InMemoryStore(), configuration.Configuration()
+    todos.put_todos(store, None, configurable, [("a", todo("Dentist", 1)), ("b", todo("Taxes", 30))])
+    assert [i.key for i in todos.due_soon(store, configurable, days=7, now=NOW)] == ["a"]
+
+    todos.put_todos(store, None, configurable, [("a", todo("Dentist", 1, status="done")), ("b", todo("Taxes", 3))])
+    assert [i.key for i in todos.due_soon(store, configurable, days=7, now=NOW)] == ["b"]
+    assert [i.key for i in todos.due_soon(store, configurable, days=7, now=NOW, statuses=["done"])] == ["a"]
+
+def test_long_ranges_list_the_existing_buckets():
+    store, configurable = InMemoryStore(), configuration.Configuration()
+    todos.put_todos(store, None, configurable, [("a", todo("Renew passport", 200)), ("b", todo("Dentist", 2))])
+    found = todos.due_between(store, configurable, NOW, NOW + timedelta(days=365))
+    assert [i.key for i in found] == ["b", "a"]
+
+def test_due_soon_ops_are_merged_into_the_memory_load():
+    store, configurable = InMemoryStore(), configuration.Configuration()
+    todos.put_todos(store, None, configurable, [("a", todo("Dentist", 1)), ("b", todo("Taxes", 30))])
+    loaded = memories.load_memories(store, configurable, extra_ops=todos.due_soon_ops(configurable, 7, now=NOW))
+    # "a" is found by both the ToDo search and the index, but only kept once
+    assert sorted(i.key for i in loaded.todo) == ["a", "b"]
+    assert todos.due_soon_ops(configurable, 0) == []
@@ -0,0 +1,190 @@
+""" Compact rendering of the ToDo list for the task_mAIstro system prompt
+
+Instead of the repr of every stored ToDo, each task is rendered on one line.
+Only the statuses shown in the prompt (`todo_statuses`) are rendered. The
+store query already filters them on a fresh load, but the run cache also holds
+the tasks an update has just marked done or archived. Tasks are ranked by
+deadline (soonest first, tasks without one last) and then by how recently they
+were updated, and rendered until a token budget is used up; the number of
+tasks left out is reported on the last line.
+
+ToDos with a deadline are also indexed by (todo_category, user_id, status,
+deadline day): a copy of each is kept under the namespace
+("todo_due", todo_category, user_id, status, "YYYY-MM-DD"), maintained by
+`put_todos` in the same store batch as the ToDo itself. `due_between` then
+answers "what's due this week" by searching only the day buckets in range,
+instead of scanning the user's whole ToDo namespace. task_mAIstro adds the
+searches of `due_soon_ops` to its batched memory load, so tasks due in the
+next `due_soon_days` days reach the system prompt even when the list is too
+long for the per-status search to fetch them.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from langgraph.store.base import BaseStore, GetOp, Item, ListNamespacesOp, MatchCondition, PutOp, SearchOp
+
+import configuration
+import memories
+
+# Namespace kind of the deadline index
+INDEX_KIND = "todo_due"
+
+# ToDos fetched per day bucket
+BUCKET_LIMIT = 1000
+
+# Ranges up to this many days search every day bucket; longer ones list the non-empty buckets first
+MAX_ENUMERATED_DAYS = 62
+MAX_LISTED_BUCKETS = 100_000
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+def parse_deadline(todo: dict[str, Any]) -> Optional[datetime]:
+    """The deadline of a ToDo value as an aware datetime (naive deadlines are taken as UTC), if it has one"""
+    value = todo.get("deadline")
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def deadline(item: Item) -> Optional[datetime]:
+    return parse_deadline(item.value)
+
+def rank_todos(items: list[Item]) -> list[Item]:
+    """Soonest deadline first, then most recently updated"""
+    by_recency = sorted(items, key=lambda item: item.updated_at, reverse=True)
+    return sorted(by_recency, key=lambda item: (deadline(item) is None, deadline(item) or datetime.min.replace(tzinfo=timezone.utc)))
+
+def render_todo(item: Item) -> str:
+    todo = item.value
+    details = [todo.get("status", "not started")]
+    due = deadline(item)
+    if due is not None:
+        details.append(f"due {due:%Y-%m-%d %H:%M}")
+    if todo.get("time_to_complete"):
+        details.append(f"{todo['time_to_complete']} min")
+    line = f"- {todo.get('task', '')} ({', '.join(details)})"
+    if todo.get("solutions"):
+        line += f" | options: {'; '.join(todo['solutions'])}"
+    return line
+
+def render_todos(items: list[Item], max_tokens: int, statuses: Iterable[str]) -> str:
+    """One line per ToDo with one of `statuses`, most urgent first, within about `max_tokens` tokens"""
+    lines, used = [], 0
+    statuses = set(statuses)
+    ranked = rank_todos([item for item in items if item.value.get("status", "not started") in statuses])
+    for item in ranked:
+        line = render_todo(item)
+        tokens = estimate_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        lines.append(line)
+        used += tokens
+    omitted = len(ranked) - len(lines)
+    if omitted:
+        lines.append(f"({omitted} more tasks not shown)")
+    return "\n".join(lines)
+
+### Deadline index
+
+def index_namespace(configurable: configuration.Configuration, status: str, day: date) -> tuple[str, ...]:
+    return memories.namespace(INDEX_KIND, configurable) + (status, day.isoformat())
+
+def _index_location(configurable: configuration.Configuration, todo: Optional[dict[str, Any]]) -> Optional[tuple[str, ...]]:
+    due = parse_deadline(todo) if todo else None
+    if due is None:
+        return None
+    return index_namespace(configurable, todo.get("status", "not started"), due.astimezone(timezone.utc).date())
+
+def index_ops(configurable: configuration.Configuration, key: str,
+              old: Optional[dict[str, Any]], new: Optional[dict[str, Any]]) -> list[PutOp]:
+    """Index updates for a ToDo changing from `old` to `new` (either may be None)"""
+    old_location, new_location = _index_location(configurable, old), _index_location(configurable, new)
+    ops = []
+    if old_location is not None and old_location != new_location:
+        # A PutOp without a value deletes the item
+        ops.append(PutOp(namespace=old_location, key=key, value=None))
+    if new_location is not None:
+        ops.append(PutOp(namespace=new_location, key=key, value=new))
+    return ops
+
+def put_todos(store: BaseStore, cache: Optional[dict], configurable: configuration.Configuration,
+              items: list[tuple[str, dict[str, Any]]]) -> dict[str, list[dict]]:
+    """Write ToDos through the run cache and keep the deadline index in step.
+
+    Reads the previous versions in one batch and writes the ToDos and the index
+    changes in another; returns the `memory_cache` state update.
+    """
+    namespace = memories.namespace("todo", configurable)
+    previous = store.batch([GetOp(namespace=namespace, key=key) for key, _ in items]) if items else []
+    extra_ops = [op for (key, value), old in zip(items, previous)
+                 for op in index_ops(configurable, key, old.value if old else None, value)]
+    return memories.write_through(store, cache, namespace, items, extra_ops=extra_ops)
+
+def rebuild_index(store: BaseStore, configurable: configuration.Configuration, page_size: int = 1000) -> int:
+    """Index every ToDo of the configured user (e.g. ones written before the index existed); returns the count"""
+    namespace = memories.namespace("todo", configurable)
+    indexed, offset = 0, 0
+    while True:
+        page = store.search(namespace, limit=page_size, offset=offset)
+        ops = [op for item in page for op in index_ops(configurable, item.key, None, item.value)]
+        if ops:
+            store.batch(ops)
+        indexed += len(page)
+        offset += len(page)
+        if len(page) < page_size:
+            return indexed
+
+def _days(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+def _bucket_ops(configurable: configuration.Configuration, statuses: Iterable[str], days: list[date]) -> list[SearchOp]:
+    return [SearchOp(namespace_prefix=index_namespace(configurable, status, day), limit=BUCKET_LIMIT)
+            for status in statuses for day in days]
+
+def due_soon_ops(configurable: configuration.Configuration, days: int, now: Optional[datetime] = None,
+                 statuses: Optional[Iterable[str]] = None) -> list[tuple[str, SearchOp]]:
+    """("todo", SearchOp) pairs for `memories.load_memories(extra_ops=...)`, fetching the ToDos
+    due from today through `days` days from now (UTC days; none if `days` is 0)"""
+    if days <= 0:
+        return []
+    now = now or datetime.now(timezone.utc)
+    statuses = list(statuses) if statuses is not None else memories.todo_statuses(configurable)
+    today = now.astimezone(timezone.utc).date()
+    return [("todo", op) for op in _bucket_ops(configurable, statuses, _days(today, today + timedelta(days=days)))]
+
+def due_between(store: BaseStore, configurable: configuration.Configuration, start: datetime, end: datetime,
+                statuses: Optional[Iterable[str]] = None) -> list[Item]:
+    """ToDos with a deadline in [start, end], soonest first.
+
+    `statuses` defaults to the ones shown in the system prompt (`todo_statuses`).
+    Naive datetimes are taken as UTC.
+    """
+    start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    statuses = list(statuses) if statuses is not None else memories.todo_statuses(configurable)
+    days = _days(start.astimezone(timezone.utc).date(), end.astimezone(timezone.utc).date())
+
+    if len(days) <= MAX_ENUMERATED_DAYS:
+        ops = _bucket_ops(configurable, statuses, days)
+    else:
+        # Only search the buckets that exist, listed with one batched call
+        first, last = days[0].isoformat(), days[-1].isoformat()
+        prefix = memories.namespace(INDEX_KIND, configurable)
+        listings = store.batch([ListNamespacesOp(match_conditions=(MatchCondition(match_type="prefix", path=prefix + (status,)),),
+                                                 limit=MAX_LISTED_BUCKETS)
+                                for status in statuses])
+        ops = [SearchOp(namespace_prefix=namespace, limit=BUCKET_LIMIT)
+               for listing in listings for namespace in listing if first <= namespace[-1] <= last]
+
+    results = store.batch(ops)
+    # Bucket boundaries are whole days, so trim to the exact range
+    items = [item for result in results for item in result if start <= deadline(item) <= end]
+    return sorted(items, key=deadline)
+
+def due_soon(store: BaseStore, configurable: configuration.Configuration, days: int = 7,
+             now: Optional[datetime] = None, statuses: Optional[Iterable[str]] = None) -> list[Item]:
+    """ToDos due in the next `days` days, soonest first"""
+    now = now or datetime.now(timezone.utc)
+    return due_between(store, configurable, now, now + timedelta(days=days), statuses)